@@ -6,32 +6,191 @@ using a scoring algorithm. Built with SQLite for storage
 and vanilla JS for the frontend.
 """
 
-from flask import Flask, render_template, request, jsonify
-import sqlite3
-import json
+from flask import Flask, render_template, request, jsonify, g, stream_with_context
+from collections import deque
+import atexit
+import logging
+import math
 import os
+import time
+
+from catalog import RECIPE_FIELDS, Catalog, encode_row, iter_recipes
+from database import DIFFICULTY_RANK, ensure_database
+from db_pool import ConnectionPool
+from http_cache import PreparedResponse
+from json_provider import HAVE_ORJSON, OrJSONProvider
+from lru import LRUCache
+from ratings import RatingBusy, RatingQueue, add_rating
+from search_index import SearchFilters, find_missing_ingredients, max_difficulty_rank
+from search_batch import SearchFailed, score_in_processes, score_recipes, shutdown_executor
+from search_text import text_search
+from search_vector import HAVE_NUMPY
 
 # ── App Setup ──────────────────────────────────────────────
 app = Flask(__name__)
 DATABASE = os.path.join(os.path.dirname(__file__), 'recipes.db')
 
+# Which search backend scores /api/search:
+#   "index" -> in-memory inverted index (search_index.py)
+#   "sql"   -> GROUP BY over the recipe_ingredients table (search_sql.py)
+#   "vector" -> NumPy sparse matrix scoring (search_vector.py)
+app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'index')
+
+# The vector backend needs NumPy; without it we use the Python index
+if app.config['SEARCH_BACKEND'] == 'vector' and not HAVE_NUMPY:
+    app.logger.warning('SEARCH_BACKEND=vector needs numpy; using the index backend')
+    app.config['SEARCH_BACKEND'] = 'index'
+
+# JSON encoder for responses: "orjson" (default, if installed) or "stdlib"
+app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND', 'orjson')
+if app.config['JSON_BACKEND'] == 'orjson':
+    if HAVE_ORJSON:
+        app.json = OrJSONProvider(app)
+    else:
+        app.config['JSON_BACKEND'] = 'stdlib'
+
 # ── Database Initialization ────────────────────────────────
 def init_db():
-    """Initialize the database if it doesn't exist."""
-    if not os.path.exists(DATABASE):
-        print("Database not found. Creating new database...")
-        from database import create_database
-        create_database()
+    """
+    Create the database if it doesn't exist, or migrate it if its schema
+    is older. Runs in every worker at startup (see create_app()); a file
+    lock makes them take turns, and a database that is already current
+    is left untouched, so only the first worker does any work.
+    """
+    action = ensure_database(DATABASE)
+    if action == 'created':
+        app.logger.info('Database not found; created %s', DATABASE)
+    elif action == 'migrated':
+        app.logger.info('Migrated %s to the current schema', DATABASE)
 
 
 # ── Database Helper ────────────────────────────────────────
-# We use a helper function to get a fresh connection each time.
-# This avoids issues with SQLite's thread-safety limitations.
+# Each worker process keeps a small pool of open connections
+# (see db_pool.py). A request borrows one connection the first time
+# it calls get_db(), and Flask hands it back when the request ends.
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+db_pool = ConnectionPool(DATABASE, max_size=app.config['DB_POOL_SIZE'])
+
+
 def get_db():
-    """Open a new database connection for each request."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # So we can access columns by name
-    return conn
+    """Return this request's database connection, borrowing one from the pool."""
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Give the request's connection back to the pool."""
+    db = g.pop('db', None)
+    if db is not None:
+        db_pool.release(db)
+
+
+# ── Recipe Catalogue ───────────────────────────────────────
+# Recipes are cached in memory, already decoded, and reloaded only
+# when the catalog_version counters change (see catalog.py).
+# The ingredient search index is built from the same cache.
+recipe_catalog = Catalog()
+
+# Pool generation the caches were filled from. If the database file is
+# replaced, the pool reopens its connections and bumps its generation;
+# the new file's version counters may repeat old values, so everything
+# cached from the old file is dropped.
+cache_generation = db_pool.generation
+
+
+def get_catalog():
+    """Return the recipe catalogue, refreshed if the database changed."""
+    global cache_generation
+    db = get_db()
+    if db_pool.generation != cache_generation:
+        cache_generation = db_pool.generation
+        recipe_catalog.forget()
+        detail_cache.clear()
+        listing_cache.clear()
+        if search_cache is not None:
+            search_cache.clear()
+    recipe_catalog.refresh(db)
+    return recipe_catalog
+
+
+# ── Rating Writes ──────────────────────────────────────────
+# With RATING_WRITE_BEHIND=1, /api/rate queues votes in memory and a
+# background thread writes them in batches (see ratings.py). Queued
+# votes are flushed when the worker exits (atexit, and gunicorn's
+# worker_exit hook in gunicorn.conf.py).
+app.config['RATING_WRITE_BEHIND'] = os.environ.get('RATING_WRITE_BEHIND') == '1'
+app.config['RATING_FLUSH_MS'] = int(os.environ.get('RATING_FLUSH_MS', 200))
+app.config['RATING_BATCH_SIZE'] = int(os.environ.get('RATING_BATCH_SIZE', 100))
+# 0 = don't fsync each vote's spill file before answering (see ratings.py)
+app.config['RATING_SPILL_FSYNC'] = os.environ.get('RATING_SPILL_FSYNC', '1') != '0'
+rating_queue = None
+if app.config['RATING_WRITE_BEHIND']:
+    rating_queue = RatingQueue(
+        db_pool, DATABASE + '.ratings',
+        flush_ms=app.config['RATING_FLUSH_MS'],
+        batch_size=app.config['RATING_BATCH_SIZE'],
+        fsync=app.config['RATING_SPILL_FSYNC']
+    )
+    atexit.register(rating_queue.close)
+
+
+# Page size limits for GET /api/recipes?limit= (and ?ids= batches)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_BATCH_IDS = 500
+
+# Rows read (and sent) at a time by the streaming NDJSON export
+STREAM_BATCH_SIZE = 200
+
+# How many results POST /api/search returns (the "k" field)
+DEFAULT_SEARCH_K = 5
+MAX_SEARCH_K = 50
+
+# POST /api/recommendations: results returned, and the most ratings
+# a client may send (the latest rating of each recipe counts)
+DEFAULT_RECOMMENDATIONS = 9
+MAX_RECOMMENDATIONS = 50
+MAX_RATING_HISTORY = 500
+
+# How many completions GET /api/suggest returns (the "limit" parameter)
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 25
+
+# Serialized single-recipe payloads, keyed by content version, id and
+# the recipe's vote count, so a vote only retires that recipe's entry
+# and entries from an older version simply age out of the cache.
+app.config['DETAIL_CACHE_SIZE'] = int(os.environ.get('DETAIL_CACHE_SIZE', 512))
+detail_cache = LRUCache(app.config['DETAIL_CACHE_SIZE'])
+
+# Serialized ?fields= projections of GET /api/recipes, keyed by both
+# catalogue versions and the field set. The full listing is kept by the
+# catalogue itself; projections go here so a client can't pin one
+# serialized copy of the catalogue per field combination.
+app.config['LISTING_CACHE_SIZE'] = int(os.environ.get('LISTING_CACHE_SIZE', 16))
+listing_cache = LRUCache(app.config['LISTING_CACHE_SIZE'])
+
+# Scored /api/search results, keyed by catalogue version + the
+# normalized query. Entries also expire after SEARCH_CACHE_TTL seconds.
+# Set SEARCH_CACHE_SIZE=0 to turn the cache off.
+app.config['SEARCH_CACHE_SIZE'] = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))
+app.config['SEARCH_CACHE_TTL'] = float(os.environ.get('SEARCH_CACHE_TTL', 300))
+search_cache = None
+if app.config['SEARCH_CACHE_SIZE'] > 0:
+    search_cache = LRUCache(app.config['SEARCH_CACHE_SIZE'], ttl=app.config['SEARCH_CACHE_TTL'])
+
+# Partial credit for a missing ingredient the user can substitute
+# (see substitutions.py): 0.5 = half a match, 0 = ignore substitutions
+app.config['SUBSTITUTE_CREDIT'] = float(os.environ.get('SUBSTITUTE_CREDIT', 0.5))
+
+# POST /api/search/batch scores batches of at least
+# SEARCH_BATCH_PARALLEL_MIN queries across SEARCH_BATCH_WORKERS
+# processes (0 = always score in this worker).
+app.config['SEARCH_BATCH_WORKERS'] = int(os.environ.get('SEARCH_BATCH_WORKERS', 0))
+app.config['SEARCH_BATCH_PARALLEL_MIN'] = int(os.environ.get('SEARCH_BATCH_PARALLEL_MIN', 500))
+# The process pool is started on the first big batch and kept; stop it on exit
+atexit.register(shutdown_executor)
 
 
 # ── Routes ─────────────────────────────────────────────────
@@ -52,21 +211,213 @@ def get_all_recipes():
     """
     Return all recipes from the database.
     Used to populate the browse section.
+
+    The JSON body is serialized (and compressed) once per catalogue
+    version. Browsers revalidate with If-None-Match and get a 304
+    when nothing changed.
+
+    Optional query parameters:
+      fields=name,cuisine  -> only return these fields (plus id)
+      limit=20             -> page size, returns {"recipes", "next_cursor"}
+      cursor=<id>          -> continue after this recipe id
+      ids=1,5,9            -> only these recipes, in the order given
+      stream=1             -> NDJSON export, one recipe per line (also
+                              chosen by Accept: application/x-ndjson);
+                              takes limit and cursor, but not ids
+    Without any parameters the response is the full list, as before.
+    """
+    try:
+        fields = parse_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if wants_ndjson():
+        if 'ids' in request.args:
+            return jsonify({'error': 'ids cannot be combined with stream'}), 400
+        try:
+            limit = request.args.get('limit')
+            limit = int(limit) if limit else None
+            cursor = request.args.get('cursor')
+            cursor = int(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'limit and cursor must be integers'}), 400
+        if limit is not None and limit < 1:
+            return jsonify({'error': 'limit must be at least 1'}), 400
+        return stream_recipes(fields, cursor, limit)
+
+    catalog = get_catalog()
+
+    ids = request.args.get('ids')
+    if ids is not None:
+        # Batch lookup for the favorites view: primary-key hits only
+        try:
+            ids = [int(i) for i in ids.split(',') if i.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+        if len(ids) > MAX_BATCH_IDS:
+            return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+        recipes = [catalog.get(i) for i in ids]
+        return jsonify(project_recipes([r for r in recipes if r is not None], fields))
+
+    paginated = 'limit' in request.args or 'cursor' in request.args
+    if not paginated:
+        # Whole listing: serialized once per catalogue version
+        build = lambda: PreparedResponse(
+            jsonify(project_recipes(catalog.recipes, fields)).get_data(),
+            catalog.updated_at
+        )
+        if not fields:
+            return catalog.derived('all_recipes', build).respond(request)
+        key = (catalog.content_version, catalog.ratings_version, tuple(sorted(fields)))
+        prepared = listing_cache.get(key)
+        if prepared is None:
+            prepared = build()
+            listing_cache.put(key, prepared)
+        return prepared.respond(request)
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers'}), 400
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    recipes, next_cursor = catalog.page(cursor, limit)
+    return jsonify({
+        'recipes': project_recipes(recipes, fields),
+        'next_cursor': next_cursor
+    })
+
+
+def parse_fields():
+    """
+    Read the ?fields= parameter: a list of field names starting with
+    id, or None for all fields. Raises ValueError for unknown fields.
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    fields = [f.strip() for f in fields.split(',')]
+    fields = ['id'] + [f for f in fields if f and f != 'id']
+    unknown = [f for f in fields if f not in RECIPE_FIELDS]
+    if unknown:
+        raise ValueError('Unknown field(s): ' + ', '.join(unknown))
+    return fields
+
+
+def wants_ndjson():
+    """Check whether the client asked for the streaming NDJSON export."""
+    if request.args.get('stream') == '1':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+
+def stream_recipes(fields, after_id=None, limit=None):
+    """
+    Stream every recipe (or `limit` recipes after id `after_id`) as
+    NDJSON, straight from a database cursor.
+
+    Rows are read with fetchmany() and each batch is serialized and
+    sent before the next one is read, so memory use doesn't grow with
+    the catalogue and the first bytes go out right away. Nothing is
+    transformed here, so the stored JSON columns are passed through
+    without decoding them.
     """
     db = get_db()
-    recipes = db.execute('SELECT * FROM recipes').fetchall()
-    db.close()
 
-    # Convert Row objects to dictionaries so we can serialize them
-    result = []
-    for r in recipes:
-        recipe = dict(r)
-        recipe['ingredients'] = json.loads(recipe['ingredients'])
-        recipe['nutrition'] = json.loads(recipe['nutrition'])
-        recipe['substitutions'] = json.loads(recipe['substitutions'])
-        result.append(recipe)
+    def generate():
+        lines = []
+        for row in iter_recipes(db, fields, batch_size=STREAM_BATCH_SIZE, decode=False,
+                                after_id=after_id, limit=limit):
+            lines.append(encode_row(row, app.json.dumps) + '\n')
+            if len(lines) == STREAM_BATCH_SIZE:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def project_recipes(recipes, fields):
+    """Keep only the requested fields of each recipe (all of them if None)."""
+    if not fields:
+        return recipes
+    return [{field: recipe[field] for field in fields} for recipe in recipes]
+
 
-    return jsonify(result)
+@app.route('/api/recipes/search', methods=['GET'])
+def search_recipes_text():
+    """
+    Full-text search over recipe names, descriptions and instructions.
+    Uses the FTS5 index (search_text.py), best matches first, and adds
+    a `snippet` with the matching words wrapped in <mark> tags.
+
+    Query parameters:
+      q=garlic butter  -> words to find (all of them must appear)
+      limit=20         -> page size
+      offset=0         -> skip this many results, returns "next_offset"
+      fields=name      -> only return these fields (plus id and snippet)
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Missing search text (q)'}), 400
+    try:
+        fields = parse_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+    if offset < 0:
+        return jsonify({'error': 'offset must not be negative'}), 400
+
+    hits, total = text_search(get_db(), q, limit=limit, offset=offset)
+
+    catalog = get_catalog()
+    recipes = []
+    for recipe_id, snippet, rank in hits:
+        recipe = catalog.get(recipe_id)
+        if recipe is None:
+            continue  # deleted since the catalogue loaded
+        recipe = project_recipes([recipe], fields)[0]
+        recipes.append({**recipe, 'snippet': snippet, 'rank': rank})
+
+    more = offset + limit < total
+    return jsonify({
+        'recipes': recipes,
+        'total': total,
+        'next_offset': offset + limit if more else None
+    })
+
+
+@app.route('/api/recipes/<int:recipe_id>', methods=['GET'])
+def get_recipe(recipe_id):
+    """
+    Return a single recipe by id.
+    Used by the recipe detail modal, so it doesn't need the whole catalogue.
+    The serialized payload is kept in an LRU cache until the recipe changes.
+    """
+    catalog = get_catalog()
+    recipe = catalog.get(recipe_id)
+    if recipe is None:
+        return jsonify({'error': 'Recipe not found'}), 404
+    # Votes only change rating and rating_count, and every vote bumps the count
+    key = (catalog.content_version, recipe_id, recipe['rating_count'])
+
+    prepared = detail_cache.get(key)
+    if prepared is None:
+        prepared = PreparedResponse(jsonify(recipe).get_data(), catalog.updated_at)
+        detail_cache.put(key, prepared)
+
+    return prepared.respond(request)
 
 
 @app.route('/api/search', methods=['POST'])
@@ -78,130 +429,361 @@ def search_recipes():
 
     Algorithm overview:
     1. Parse user input (ingredients list + filters)
-    2. Filter recipes by dietary, difficulty, and time constraints
+    2. Filter recipes by dietary, difficulty, time and nutrition constraints
     3. Score remaining recipes by ingredient overlap
-    4. Sort by score descending, return top 3-5 matches
+    4. Pick the top k matches by score (k defaults to 5)
+
+    Steps 2 and 3 run against an in-memory inverted index
+    (search_index.py) or inside SQLite (search_sql.py), depending on
+    SEARCH_BACKEND, so we never decode every row.
     """
-    data = request.get_json()
+    try:
+        user_ingredients, filters, servings, k = parse_search(request.get_json())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # ── Step 1 + 2: Filter and Score ───────────────────────
+    # Both backends only look at recipes that share at least one
+    # ingredient with the user, already filtered by dietary,
+    # difficulty and time constraints.
+    #
+    # Score formula:
+    #   match_score = matched_count / total_recipe_ingredients
+    #
+    # This gives a value between 0.0 and 1.0.
+    # A score of 1.0 means the user has ALL ingredients.
+    catalog = get_catalog()
+    result = cached_search(catalog, user_ingredients, filters, k)
+
+    # ── Step 3: Rank and Return ────────────────────────────
+    return jsonify(build_search_response(catalog, result, servings))
+
+
+def parse_search(data):
+    """
+    Read and validate one search query (a JSON object).
+    Returns (user_ingredients, filters, servings, k), where `filters`
+    is a SearchFilters tuple,
+    or raises ValueError with a message for the client.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Search query must be a JSON object.')
 
     # Extract user inputs with sensible defaults
     user_ingredients = data.get('ingredients', [])
     dietary = data.get('dietary', '')          # e.g. "vegetarian", "vegan"
     max_difficulty = data.get('difficulty', '')  # "easy", "medium", "hard"
     max_time = data.get('max_time', 999)        # in minutes
+    max_calories = data.get('max_calories')     # per serving, None = no limit
+    min_protein = data.get('min_protein')       # grams per serving
     servings = data.get('servings', 0)          # 0 means "no preference"
+    k = data.get('k', DEFAULT_SEARCH_K)         # number of results
+
+    if not isinstance(user_ingredients, list) or not all(
+        isinstance(ing, str) for ing in user_ingredients
+    ):
+        raise ValueError('ingredients must be a list of strings')
 
     # Normalize user ingredients to lowercase for fair comparison
     user_ingredients = [ing.strip().lower() for ing in user_ingredients if ing.strip()]
 
     if not user_ingredients:
-        return jsonify({'error': 'Please enter at least one ingredient.'}), 400
+        raise ValueError('Please enter at least one ingredient.')
+
+    if isinstance(k, bool) or not isinstance(k, int):
+        raise ValueError('k must be an integer')
+    if not (1 <= k <= MAX_SEARCH_K):
+        raise ValueError(f'k must be between 1 and {MAX_SEARCH_K}')
+
+    # Filters left empty ("Any" in the dropdowns) don't filter
+    if dietary is None:
+        dietary = ''
+    if max_difficulty is None:
+        max_difficulty = ''
+    if not isinstance(dietary, str):
+        raise ValueError('dietary must be a string')
+    if not isinstance(max_difficulty, str) or (
+        max_difficulty and max_difficulty not in DIFFICULTY_RANK
+    ):
+        raise ValueError('difficulty must be one of: ' + ', '.join(DIFFICULTY_RANK))
+
+    # The frontend sends parseInt() of an empty box as null
+    if servings is None:
+        servings = 0
+    if isinstance(servings, bool) or not isinstance(servings, int) or servings < 0:
+        raise ValueError('servings must be a non-negative integer')
+
+    try:
+        max_time = int(max_time)
+    except (TypeError, ValueError):
+        raise ValueError('max_time must be an integer')
+
+    try:
+        if isinstance(max_calories, bool) or isinstance(min_protein, bool):
+            raise TypeError
+        max_calories = float(max_calories) if max_calories is not None else None
+        min_protein = float(min_protein) if min_protein is not None else None
+    except (TypeError, ValueError):
+        raise ValueError('max_calories and min_protein must be numbers')
+    # NaN compares false with everything, so backends would disagree on it
+    if any(v is not None and not math.isfinite(v) for v in (max_calories, min_protein)):
+        raise ValueError('max_calories and min_protein must be finite numbers')
+
+    filters = SearchFilters(
+        dietary, max_difficulty_rank(max_difficulty), max_time, max_calories, min_protein
+    )
+    return user_ingredients, filters, servings, k
 
-    # Fetch all recipes from the database
-    db = get_db()
-    recipes = db.execute('SELECT * FROM recipes').fetchall()
-    db.close()
-
-    # ── Step 1: Filter ─────────────────────────────────────
-    # We eliminate recipes that don't match the user's constraints
-    # BEFORE scoring. This is more efficient than scoring everything
-    # and filtering afterwards.
-    filtered = []
-    for r in recipes:
-        recipe = dict(r)
-        recipe['ingredients'] = json.loads(recipe['ingredients'])
-        recipe['nutrition'] = json.loads(recipe['nutrition'])
-        recipe['substitutions'] = json.loads(recipe['substitutions'])
-
-        # Dietary filter: skip if recipe doesn't match
-        if dietary and recipe['dietary'] != dietary:
-            continue
-
-        # Difficulty filter: map to numeric for comparison
-        difficulty_map = {'easy': 1, 'medium': 2, 'hard': 3}
-        if max_difficulty:
-            recipe_diff = difficulty_map.get(recipe['difficulty'], 2)
-            filter_diff = difficulty_map.get(max_difficulty, 3)
-            if recipe_diff > filter_diff:
-                continue
-
-        # Time filter: skip if recipe takes too long
-        if recipe['cook_time'] > int(max_time):
-            continue
-
-        filtered.append(recipe)
-
-    # ── Step 2: Score ──────────────────────────────────────
-    # For each filtered recipe, calculate how well user's
-    # ingredients match what the recipe needs.
-    #
-    # Score formula:
-    #   match_score = matched_count / total_recipe_ingredients
-    #
-    # This gives a value between 0.0 and 1.0.
-    # A score of 1.0 means the user has ALL ingredients.
-    # We also track which ingredients are missing.
-    scored = []
-    for recipe in filtered:
-        recipe_ingredients = [ing.lower() for ing in recipe['ingredients']]
-        total = len(recipe_ingredients)
-
-        # Count how many of user's ingredients appear in this recipe.
-        # We use substring matching so "tomato" matches "tomatoes" etc.
-        matched = 0
-        missing = []
-        for r_ing in recipe_ingredients:
-            found = False
-            for u_ing in user_ingredients:
-                # Check if user ingredient is part of recipe ingredient
-                # e.g., "chicken" matches "chicken breast"
-                if u_ing in r_ing or r_ing in u_ing:
-                    found = True
-                    break
-            if found:
-                matched += 1
-            else:
-                missing.append(r_ing)
-
-        # Calculate score as a percentage
-        score = round((matched / total) * 100, 1) if total > 0 else 0
-
-        # Only include recipes where at least one ingredient matched
-        if matched > 0:
-            recipe['match_score'] = score
-            recipe['matched_count'] = matched
-            recipe['total_ingredients'] = total
-            recipe['missing_ingredients'] = missing
-            scored.append(recipe)
-    
-    
-    # ── Step 3: Rank and Return ────────────────────────────
-    # Sort by score (highest first) and return top 5
-    scored.sort(key=lambda x: x['match_score'], reverse=True)
-    top_results = scored[:5]
 
-    # Adjust servings if requested
+def cached_search(catalog, user_ingredients, filters, k):
+    """
+    Score one query with the configured backend, through the search cache.
+    Returns (matched, top_scored, total_filtered, total_scored).
+    """
+    # Popular searches repeat a lot, so the scored result is cached.
+    # The key is the sorted, de-duplicated ingredient set plus the
+    # filters; servings is left out because scaling happens afterwards
+    # on a copy. The content version in the key retires old entries.
+    # Ratings aren't part of the scores and are read fresh later.
+    key = (
+        catalog.content_version, app.config['SEARCH_BACKEND'],
+        tuple(sorted(set(user_ingredients))), filters, k
+    )
+    result = search_cache.get(key) if search_cache is not None else None
+    if result is None:
+        result = score_recipes(
+            get_db(), catalog, app.config['SEARCH_BACKEND'],
+            user_ingredients, filters, k, credit=app.config['SUBSTITUTE_CREDIT']
+        )
+        if search_cache is not None:
+            search_cache.put(key, result)
+    return result
+
+
+def build_search_response(catalog, result, servings):
+    """
+    Turn a scored result into the /api/search response body.
+
+    Scoring only produced (id, score, matched, total) tuples; full
+    recipes and missing-ingredient lists are built for the k winners.
+    """
+    matched, covered, top_scored, total_filtered, total_scored = result
+
+    top_results = []
+    for recipe_id, score, matched_count, total in top_scored:
+        cached = catalog.get(recipe_id)
+        if cached is None:
+            continue  # added to the database after our catalogue refresh
+        recipe = dict(cached)
+        recipe['match_score'] = score
+        recipe['matched_count'] = matched_count
+        recipe['total_ingredients'] = total
+        recipe['missing_ingredients'] = find_missing_ingredients(
+            recipe['ingredients'], matched
+        )
+        # Missing ingredients the user can replace: {ingredient: substitute}
+        recipe['substituted_ingredients'] = covered.get(recipe_id, {})
+        top_results.append(recipe)
+
+    # Adjust servings if requested: the per-serving columns make this
+    # one multiplication per value (see create_nutrition_columns)
     if servings and servings > 0:
         for recipe in top_results:
             ratio = servings / recipe['servings']
-            # Scale nutrition values
-            for key in recipe['nutrition']:
-                recipe['nutrition'][key] = round(recipe['nutrition'][key] * ratio, 1)
+            per_serving = catalog.per_serving.get(recipe['id'], {})
+            recipe['nutrition'] = {
+                key: round(per_serving[key] * servings if key in per_serving else value * ratio, 1)
+                for key, value in recipe['nutrition'].items()
+            }
             recipe['servings'] = servings
             recipe['serving_ratio'] = ratio  # Frontend uses this to show adjusted amounts
 
-    return jsonify({
+    return {
         'results': top_results,
-        'total_filtered': len(filtered),
-        'total_scored': len(scored)
-    })
+        'total_filtered': total_filtered,
+        'total_scored': total_scored
+    }
+
+
+@app.route('/api/search/batch', methods=['POST'])
+def search_batch():
+    """
+    Run many searches in one request (for offline/nightly jobs).
+
+    The body is either {"queries": [query, ...]} or NDJSON with one
+    query per line; each query takes the same fields as /api/search.
+    Results stream back as NDJSON, one line per query in input order:
+        {"index": 0, "results": [...], "total_filtered": .., "total_scored": ..}
+        {"index": 1, "error": "Please enter at least one ingredient."}
+
+    Large batches are scored across SEARCH_BATCH_WORKERS processes.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        # Read the body line by line, so the whole batch is never in memory
+        items = (parse_ndjson_line(line) for line in request.stream if line.strip())
+        parallel = app.config['SEARCH_BATCH_WORKERS'] > 0
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('queries'), list):
+            return jsonify({'error': 'Expected {"queries": [...]} or an NDJSON body'}), 400
+        items = data['queries']
+        parallel = (app.config['SEARCH_BATCH_WORKERS'] > 0
+                    and len(items) >= app.config['SEARCH_BATCH_PARALLEL_MIN'])
+
+    catalog = get_catalog()
+
+    def parsed():
+        """Yield (query, servings) per item, or (None, error message)."""
+        for item in items:
+            try:
+                ingredients, filters, servings, k = parse_search(item)
+            except ValueError as e:
+                yield None, str(e)
+            else:
+                yield (ingredients, filters, k), servings
+
+    def generate():
+        if not parallel:
+            for index, (query, extra) in enumerate(parsed()):
+                result = cached_search(catalog, *query) if query is not None else None
+                yield batch_line(catalog, index, result, extra)
+            return
+
+        # The pool only sees the queries; each query's servings (or
+        # error) waits here until its result comes back, in order.
+        extras = deque()
+
+        def queries():
+            for query, extra in parsed():
+                extras.append(extra)
+                yield query
+
+        results = score_in_processes(
+            DATABASE, app.config['SEARCH_BACKEND'], queries(),
+            workers=app.config['SEARCH_BATCH_WORKERS'],
+            credit=app.config['SUBSTITUTE_CREDIT']
+        )
+        for index, result in enumerate(results):
+            extra = extras.popleft()
+            if isinstance(result, SearchFailed):
+                # The chunk failed in its process; report it per query
+                result, extra = None, str(result)
+            yield batch_line(catalog, index, result, extra)
+
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def parse_ndjson_line(line):
+    """Decode one NDJSON request line (a bad line becomes an error result)."""
+    try:
+        return app.json.loads(line)
+    except ValueError:
+        return None
+
+
+def batch_line(catalog, index, result, extra):
+    """
+    Serialize one batch result. `extra` is the query's servings, or the
+    error message when the query was invalid (`result` is None then).
+    """
+    if result is None:
+        body = {'index': index, 'error': extra}
+    else:
+        body = {'index': index, **build_search_response(catalog, result, extra)}
+    return app.json.dumps(body) + '\n'
+
+
+@app.route('/api/recommendations', methods=['POST'])
+def recommend_recipes():
+    """
+    Recommend recipes from a user's rating history.
+
+    Expects JSON: {"ratings": [{"recipe_id": 3, "rating": 5}, ...], "limit": 9}
+    (the ratingHistory the browser keeps in localStorage). Recipes similar
+    to the ones rated highly come first, from the precomputed similarity
+    table (recommend.py); the rest of the list is filled with the
+    top-rated recipes the user hasn't rated. ?fields= works as for
+    /api/recipes.
+    """
+    try:
+        fields = parse_fields()
+        data = request.get_json(silent=True)
+        if data is None and request.get_data():
+            raise ValueError('Request body must be valid JSON.')
+        ratings, limit = parse_recommendations(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    catalog = get_catalog()
+    # Until the similarity table's first build finishes, everyone gets the top-rated list
+    similarity = catalog.similarity()
+    scored = similarity.recommend(ratings, limit) if similarity is not None else []
+
+    recipes = []
+    for recipe_id, score in scored:
+        recipe = catalog.get(recipe_id)
+        if recipe is not None:
+            recipes.append({**project_recipes([recipe], fields)[0], 'recommendation_score': score})
+    personalized = len(recipes)
+
+    if len(recipes) < limit:
+        # Same order the home page used before: rating, then number of votes
+        top_rated = catalog.derived('top_rated', lambda: sorted(
+            catalog.recipes, key=lambda r: (-r['rating'], -r['rating_count'], r['id'])
+        ))
+        seen = {recipe_id for recipe_id, _ in scored} | ratings.keys()
+        for recipe in top_rated:
+            if len(recipes) == limit:
+                break
+            if recipe['id'] not in seen:
+                recipes.append(project_recipes([recipe], fields)[0])
+
+    return jsonify({'recipes': recipes, 'personalized': personalized})
+
+
+def parse_recommendations(data):
+    """
+    Read and validate a recommendations request.
+    Returns ({recipe_id: rating}, limit) or raises ValueError.
+    """
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object.')
+
+    history = data.get('ratings', [])
+    if not isinstance(history, list):
+        raise ValueError('ratings must be a list')
+    if len(history) > MAX_RATING_HISTORY:
+        raise ValueError(f'At most {MAX_RATING_HISTORY} ratings per request')
+
+    ratings = {}
+    for entry in history:
+        if not isinstance(entry, dict):
+            raise ValueError('Each rating needs an integer recipe_id and rating')
+        recipe_id = entry.get('recipe_id')
+        rating = entry.get('rating')
+        if any(isinstance(v, bool) or not isinstance(v, int) for v in (recipe_id, rating)):
+            raise ValueError('Each rating needs an integer recipe_id and rating')
+        if not (1 <= rating <= 5):
+            raise ValueError('Rating must be between 1 and 5')
+        ratings[recipe_id] = rating  # later entries win
+
+    limit = data.get('limit', DEFAULT_RECOMMENDATIONS)
+    if isinstance(limit, bool) or not isinstance(limit, int):
+        raise ValueError('limit must be an integer')
+    if not (1 <= limit <= MAX_RECOMMENDATIONS):
+        raise ValueError(f'limit must be between 1 and {MAX_RECOMMENDATIONS}')
+
+    return ratings, limit
 
 
 @app.route('/api/rate', methods=['POST'])
 def rate_recipe():
     """
     Save a user's rating for a recipe.
-    Updates the average rating using a simple running average.
+    The vote is added atomically to the recipe's rating total and count
+    (see ratings.py), and the new average is returned.
     """
     data = request.get_json()
     recipe_id = data.get('recipe_id')
@@ -213,33 +795,48 @@ def rate_recipe():
     if not (1 <= int(rating) <= 5):
         return jsonify({'error': 'Rating must be between 1 and 5'}), 400
 
-    db = get_db()
-
-    # Get current rating info
-    recipe = db.execute(
-        'SELECT rating, rating_count FROM recipes WHERE id = ?',
-        (recipe_id,)
-    ).fetchone()
-
-    if not recipe:
-        db.close()
+    if rating_queue is not None:
+        # Write-behind: queue the vote and answer with the optimistic average
+        try:
+            recipe = get_catalog().get(int(recipe_id))
+        except ValueError:
+            recipe = None
+        if recipe is None:
+            return jsonify({'error': 'Recipe not found'}), 404
+        new_avg, new_count = rating_queue.submit(recipe, int(rating))
+        return jsonify({'new_rating': round(new_avg, 1), 'rating_count': new_count})
+
+    try:
+        result = add_rating(get_db(), recipe_id, int(rating))
+    except RatingBusy:
+        # The database stayed locked past the busy timeout: ask the client to retry
+        response = jsonify({'error': 'Too many ratings right now. Please try again.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+    if result is None:
         return jsonify({'error': 'Recipe not found'}), 404
 
-    # Calculate new average rating
-    # Formula: new_avg = (old_avg * count + new_rating) / (count + 1)
-    old_avg = recipe['rating']
-    old_count = recipe['rating_count']
-    new_count = old_count + 1
-    new_avg = round((old_avg * old_count + int(rating)) / new_count, 1)
+    new_avg, new_count = result
+    return jsonify({'new_rating': round(new_avg, 1), 'rating_count': new_count})
 
-    db.execute(
-        'UPDATE recipes SET rating = ?, rating_count = ? WHERE id = ?',
-        (new_avg, new_count, recipe_id)
-    )
-    db.commit()
-    db.close()
 
-    return jsonify({'new_rating': new_avg, 'rating_count': new_count})
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """
+    Return runtime counters for this worker process.
+    Handy for checking that the connection pool and caches are being reused.
+    """
+    stats = {
+        'pool': db_pool.stats(),
+        'detail_cache': detail_cache.stats(),
+        'listing_cache': listing_cache.stats()
+    }
+    if search_cache is not None:
+        stats['search_cache'] = search_cache.stats()
+    if rating_queue is not None:
+        stats['rating_queue'] = rating_queue.stats()
+    return jsonify(stats)
 
 
 @app.route('/api/substitutions/<int:recipe_id>', methods=['GET'])
@@ -248,18 +845,33 @@ def get_substitutions(recipe_id):
     Return ingredient substitutions for a specific recipe.
     Useful when a user is missing some ingredients.
     """
-    db = get_db()
-    recipe = db.execute(
-        'SELECT substitutions FROM recipes WHERE id = ?',
-        (recipe_id,)
-    ).fetchone()
-    db.close()
+    recipe = get_catalog().get(recipe_id)
 
     if not recipe:
         return jsonify({'error': 'Recipe not found'}), 404
 
-    subs = json.loads(recipe['substitutions'])
-    return jsonify(subs)
+    return jsonify(recipe['substitutions'])
+
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest():
+    """
+    Autocomplete for the quick search box.
+    Returns ingredient and recipe names starting with ?q= (at the start
+    of any word), most used first, from an in-memory index (suggest.py).
+
+    Optional query parameters:
+      limit=8  -> number of suggestions
+    """
+    q = request.args.get('q', '')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGEST_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    if not (1 <= limit <= MAX_SUGGEST_LIMIT):
+        return jsonify({'error': f'limit must be between 1 and {MAX_SUGGEST_LIMIT}'}), 400
+
+    return jsonify({'suggestions': get_catalog().suggester().suggest(q, limit)})
 
 
 # ── Error Handlers ─────────────────────────────────────────
@@ -275,8 +887,78 @@ def server_error(e):
     return jsonify({'error': 'Something went wrong on our end. Please try again.'}), 500
 
 
+# ── Startup ────────────────────────────────────────────────
+# create_app() prepares the worker before it serves anything: the
+# database is created or migrated, then the connection pool, the
+# recipe catalogue and the search structures are built up front, so
+# the first requests don't pay for them. Run gunicorn with
+# "app:create_app()" (see Procfile) so every worker does this.
+started = False
+
+
+def warm_up():
+    """Open pool connections and build the in-memory structures. Returns timings in ms."""
+    catalog = recipe_catalog
+    timings = {}
+
+    def timed(name, step):
+        begin = time.perf_counter()
+        step()
+        timings[name] = (time.perf_counter() - begin) * 1000
+
+    def build_search():
+        catalog.matcher()
+        if app.config['SUBSTITUTE_CREDIT']:
+            catalog.substitutions()
+        if app.config['SEARCH_BACKEND'] == 'vector':
+            catalog.vector_index()
+        elif app.config['SEARCH_BACKEND'] == 'index':
+            catalog.index()
+
+    timed('pool', db_pool.warm)
+    with app.app_context():
+        timed('catalog', get_catalog)
+        timed('search', build_search)
+        timed('suggest', catalog.suggester)
+    # The similarity table takes seconds on a large catalogue, so it's
+    # only started here and finishes in the background
+    catalog.similarity()
+    return timings
+
+
+def create_app():
+    """
+    Initialize the database and warm the caches, then return the app.
+    Safe to call more than once; only the first call does the work.
+    """
+    global started
+    if started:
+        return app
+    if app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)  # so the startup line shows up under gunicorn
+
+    begin = time.perf_counter()
+    init_db()
+    db_ms = (time.perf_counter() - begin) * 1000
+    timings = warm_up()
+    if rating_queue is not None:
+        # Replay votes a dead worker left in its spill files without
+        # waiting for the first vote to start the queue
+        rating_queue.start()
+    total_ms = (time.perf_counter() - begin) * 1000
+
+    app.logger.info(
+        'Worker %d ready in %.0f ms (database %.0f ms, %s; %d recipes)',
+        os.getpid(), total_ms, db_ms,
+        ', '.join(f'{name} {ms:.0f} ms' for name, ms in timings.items()),
+        len(recipe_catalog.recipes)
+    )
+    started = True
+    return app
+
+
 # ── Entry Point ────────────────────────────────────────────
 if __name__ == '__main__':
-    # Initialize database before starting the app
-    init_db()
+    # Initialize the database and warm the caches before serving
+    create_app()
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=False)
@@ -0,0 +1,119 @@
+"""
+Matcher Benchmark
+=================
+Times a whole search (match the user's terms, then score and rank the
+recipes) with the token matcher and the inverted index, against the
+old loop that ran the pairwise substring check on every recipe.
+
+The 20 sample recipes are copied many times with varied ingredient
+names ("diced onion", "fresh organic basil", ...) to build a catalogue
+big enough to show the difference.
+
+Usage:
+    python benchmarks/bench_matcher.py [number_of_recipes]
+"""
+
+import heapq
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+# Run from anywhere: the app modules live one directory up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import create_tables, seed_recipes
+from matcher import IngredientMatcher
+from search_index import IngredientIndex
+
+PREFIXES = ['', 'fresh', 'diced', 'organic', 'frozen', 'chopped', 'smoked', 'dried']
+# Results per search, like DEFAULT_SEARCH_K in app.py
+K = 5
+
+QUERIES = [
+    ['chicken', 'rice', 'garlic'],
+    ['eggs', 'tomato', 'onion', 'cheese'],
+    ['pasta', 'olive oil', 'basil', 'parmesan', 'salt', 'pepper'],
+    ['tofu', 'soy sauce', 'ginger'],
+]
+
+
+def sample_recipes():
+    """Return the seeded sample recipes as dicts."""
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    cursor = db.cursor()
+    create_tables(cursor)
+    seed_recipes(cursor)
+    rows = cursor.execute('SELECT ingredients, dietary, difficulty, cook_time FROM recipes')
+    return [{**dict(row), 'ingredients': json.loads(row['ingredients'])} for row in rows]
+
+
+def build_catalogue(size):
+    """Make `size` recipes by re-using the samples with varied names."""
+    rng = random.Random(42)
+    samples = sample_recipes()
+    catalogue = []
+    for i in range(size):
+        sample = samples[i % len(samples)]
+        catalogue.append({**sample, 'id': i + 1, 'ingredients': [
+            f'{rng.choice(PREFIXES)} {rng.choice(PREFIXES)} {ing}'.strip()
+            for ing in sample['ingredients']
+        ]})
+    return catalogue
+
+
+def substring_search(catalogue, user_ingredients):
+    """
+    The original approach: score every recipe by checking each of its
+    ingredients against every user term, then keep the best K.
+    """
+    scored = []
+    for position, recipe in enumerate(catalogue):
+        matched = 0
+        for r_ing in recipe['ingredients']:
+            r_ing = r_ing.lower()
+            for u_ing in user_ingredients:
+                if u_ing in r_ing or r_ing in u_ing:
+                    matched += 1
+                    break
+        if matched:
+            total = len(recipe['ingredients'])
+            scored.append((-round(matched / total * 100, 1), position, recipe['id']))
+    return heapq.nsmallest(K, scored)
+
+
+def indexed_search(matcher, index, user_ingredients):
+    """The new approach: resolve the terms through the token map, then walk the posting lists."""
+    return index.search(matcher.match(user_ingredients), k=K)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    catalogue = build_catalogue(size)
+
+    start = time.perf_counter()
+    matcher = IngredientMatcher(ing for recipe in catalogue for ing in recipe['ingredients'])
+    index = IngredientIndex(catalogue)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    print(f'{size} recipes, {len(matcher.tokens)} distinct ingredient names')
+    print(f'matcher + index build (once per catalogue load): {build_ms:.1f} ms\n')
+    print(f'{"query (top " + str(K) + ")":<50} {"substring":>12} {"indexed":>12} {"speedup":>9}')
+    for query in QUERIES:
+        old_ms = timed(lambda: substring_search(catalogue, query), repeat=3)
+        new_ms = timed(lambda: indexed_search(matcher, index, query), repeat=10)
+        print(f'{", ".join(query):<50} {old_ms:>10.2f}ms {new_ms:>10.3f}ms {old_ms / new_ms:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Recipe Catalogue Cache
+======================
+Keeps every recipe in memory, already decoded, so read endpoints
+don't re-read and re-parse the `recipes` table on every request.
+
+Invalidation uses the `catalog_version` table (see database.py).
+Triggers bump one of two counters whenever `recipes` changes:
+
+    content_version  -> any recipe added, removed or edited
+    ratings_version  -> only the rating columns changed
+    updated_at       -> when either counter last moved
+
+Each request reads that one-row table. If `content_version` moved we
+reload everything; if only `ratings_version` moved we refresh the
+rating columns, which needs no JSON decoding. Because the counters live
+in the database file, every gunicorn worker sees the same versions.
+"""
+
+from bisect import bisect_right
+import threading
+
+from database import NUTRITION_COLUMNS
+from json_provider import loads
+from matcher import IngredientMatcher
+from recommend import SimilarityTable
+from search_index import IngredientIndex
+from search_vector import VectorIndex
+from substitutions import SubstitutionGraph
+from suggest import Suggester
+
+
+# Columns returned by the API. The recipes table also has internal
+# bookkeeping columns (like ingredient_count) that we don't expose.
+RECIPE_COLUMNS = (
+    'id, name, description, ingredients, instructions, cook_time, difficulty, '
+    'dietary, servings, cuisine, image_url, nutrition, substitutions, '
+    'rating, rating_count'
+)
+
+# Field names a client can pick with ?fields= on /api/recipes
+RECIPE_FIELDS = tuple(column.strip() for column in RECIPE_COLUMNS.split(','))
+
+# Columns stored as JSON text
+JSON_COLUMNS = ('ingredients', 'nutrition', 'substitutions')
+
+
+def decode_recipe(row):
+    """Turn a recipes row into a plain dict with its JSON columns decoded."""
+    recipe = dict(row)
+    for column in JSON_COLUMNS:
+        if column in recipe:
+            recipe[column] = loads(recipe[column])
+    return recipe
+
+
+def encode_row(row, dumps):
+    """
+    Serialize a recipes row without decoding its JSON columns.
+
+    The stored JSON text is already valid JSON, so it's spliced into the
+    output as-is; only the plain columns go through `dumps`.
+    """
+    keys = row.keys()
+    plain = dumps({key: row[key] for key in keys if key not in JSON_COLUMNS})
+    raw = [f'"{key}":{row[key]}' for key in JSON_COLUMNS if key in keys]
+    if not raw:
+        return plain
+    if plain == '{}':
+        return '{' + ','.join(raw) + '}'
+    return plain[:-1] + ',' + ','.join(raw) + '}'
+
+
+def iter_recipes(db, fields=None, batch_size=500, decode=True, after_id=None, limit=None):
+    """
+    Yield recipes straight from the database in id order, `batch_size`
+    rows at a time, decoding each batch as it arrives. Used for streaming
+    exports, where holding every recipe at once would defeat the point.
+    With decode=False the raw rows are yielded (see encode_row).
+    `after_id` and `limit` select a range, as for Catalog.page().
+    """
+    columns = ', '.join(fields) if fields else RECIPE_COLUMNS
+    cursor = db.execute(
+        f'SELECT {columns} FROM recipes WHERE id > ? ORDER BY id LIMIT ?',
+        (after_id if after_id is not None else -1, limit if limit is not None else -1)
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield decode_recipe(row) if decode else row
+
+
+class Catalog:
+    """
+    In-memory copy of the recipes table for one worker process.
+
+    `recipes` is the list of decoded recipes in id order, `ids` holds
+    their ids (for keyset pagination) and `by_id` indexes the same dicts
+    by id. Treat both as read-only: copy a recipe
+    before changing it for a response. `per_serving` maps each id to
+    its typed per-serving nutrition values.
+    """
+
+    def __init__(self):
+        self.content_version = None
+        self.ratings_version = None
+        self.updated_at = None
+        self.recipes = []
+        self.ids = []
+        self.by_id = {}
+        self.per_serving = {}
+        self._content_derived = {}
+        self._derived = {}
+        self._lock = threading.Lock()
+        # Survives reloads, so it can be updated instead of rebuilt.
+        # It's built on a background thread (see similarity()).
+        self._similarity = SimilarityTable()
+        self._similarity_version = None   # content_version the table matches
+        self._similarity_thread = None
+
+    def refresh(self, db):
+        """Reload whatever changed since the last request."""
+        content, ratings, updated_at = db.execute(
+            'SELECT content_version, ratings_version, updated_at FROM catalog_version'
+        ).fetchone()
+        if content == self.content_version and ratings == self.ratings_version:
+            return
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if content != self.content_version:
+                self._load_content(db)
+            elif ratings != self.ratings_version:
+                self._load_ratings(db)
+            self.content_version = content
+            self.ratings_version = ratings
+            self.updated_at = updated_at
+            self._derived = {}
+
+    def forget(self):
+        """Force a full reload on the next refresh(), e.g. after the database file was replaced."""
+        with self._lock:
+            self.content_version = None
+            self.ratings_version = None
+
+    def _load_content(self, db):
+        """Read and decode the whole table."""
+        rows = db.execute(f'SELECT {RECIPE_COLUMNS} FROM recipes ORDER BY id').fetchall()
+        recipes = [decode_recipe(row) for row in rows]
+        self.by_id = {recipe['id']: recipe for recipe in recipes}
+        self.ids = [recipe['id'] for recipe in recipes]
+        self.recipes = recipes
+        self.per_serving = self._load_per_serving(db)
+        self._content_derived = {}
+
+    def _load_per_serving(self, db):
+        """Read the typed per-serving nutrition columns (see database.py)."""
+        columns = ', '.join(NUTRITION_COLUMNS)
+        per_serving = {}
+        for row in db.execute(f'SELECT id, {columns} FROM recipes'):
+            per_serving[row[0]] = {
+                column: value for column, value in zip(NUTRITION_COLUMNS, row[1:])
+                if value is not None
+            }
+        return per_serving
+
+    def _load_ratings(self, db):
+        """Refresh only the rating columns of the cached recipes."""
+        for recipe_id, rating, rating_count in db.execute(
+            'SELECT id, rating, rating_count FROM recipes'
+        ):
+            recipe = self.by_id.get(recipe_id)
+            if recipe is not None:
+                recipe['rating'] = rating
+                recipe['rating_count'] = rating_count
+
+    def get(self, recipe_id):
+        """Return a cached recipe by id, or None."""
+        return self.by_id.get(recipe_id)
+
+    def page(self, after_id=None, limit=None):
+        """
+        Return up to `limit` recipes with an id greater than `after_id`
+        (keyset pagination), plus the cursor for the next page or None.
+        """
+        start = 0 if after_id is None else bisect_right(self.ids, after_id)
+        if limit is None:
+            return self.recipes[start:], None
+        recipes = self.recipes[start:start + limit]
+        more = start + limit < len(self.recipes)
+        return recipes, (recipes[-1]['id'] if more else None)
+
+    def derived(self, key, build):
+        """
+        Return a value computed from the current catalogue, such as a
+        serialized response body. `build()` runs once per catalogue
+        version; any change to the recipes or ratings discards it.
+        """
+        derived = self._derived
+        value = derived.get(key)
+        if value is None:
+            value = derived.setdefault(key, build())
+        return value
+
+    def content_derived(self, key, build):
+        """
+        Like derived(), but only a change to the recipes themselves
+        discards the value; rating updates keep it. Used for the search
+        structures, which are too costly to rebuild on every vote.
+        """
+        value = self._content_derived.get(key)
+        if value is None:
+            with self._lock:
+                value = self._content_derived.get(key)
+                if value is None:
+                    value = build()
+                    self._content_derived[key] = value
+        return value
+
+    def index(self):
+        """Return the ingredient search index, building it on first use."""
+        return self.content_derived('index', lambda: IngredientIndex(self.recipes, self.per_serving))
+
+    def vector_index(self):
+        """Return the NumPy incidence matrix, building it on first use."""
+        return self.content_derived('vector_index', lambda: VectorIndex(self.recipes, self.per_serving))
+
+    def substitutions(self):
+        """Return the substitution graph over every recipe, building it on first use."""
+        return self.content_derived('substitutions', lambda: SubstitutionGraph(self.recipes))
+
+    def suggester(self):
+        """Return the autocomplete index over ingredient and recipe names."""
+        return self.content_derived('suggester', lambda: Suggester(self.recipes))
+
+    def similarity(self):
+        """
+        Return the recipe similarity table, or None until its first build
+        has finished.
+
+        Building takes seconds on a large catalogue, so it runs on a
+        background thread, outside the catalogue lock. After the recipes
+        change, the previous table keeps answering until the update is
+        done (update() replaces rows one at a time, so it's safe to read).
+        """
+        with self._lock:
+            if self._similarity_version != self.content_version and self._similarity_thread is None:
+                self._similarity_thread = threading.Thread(
+                    target=self._update_similarity, args=(self.recipes, self.content_version),
+                    name='similarity', daemon=True
+                )
+                self._similarity_thread.start()
+            ready = self._similarity_version is not None
+        return self._similarity if ready else None
+
+    def _update_similarity(self, recipes, version):
+        try:
+            self._similarity.update(recipes)
+            self._similarity_version = version
+        finally:
+            # If the update failed, the next similarity() call retries it
+            with self._lock:
+                self._similarity_thread = None
+
+    def matcher(self):
+        """Return the token matcher over every ingredient name in the catalogue."""
+        return self.content_derived('matcher', lambda: IngredientMatcher(
+            ing for recipe in self.recipes for ing in recipe['ingredients']
+        ))
@@ -5,22 +5,82 @@ Creates the SQLite database and seeds it with 20 sample recipes.
 Run this once before starting the Flask app.
 
 Usage:
-    python database.py
+    python database.py            # create a fresh database
+    python database.py --migrate  # upgrade an existing database
+    python database.py --import recipes.jsonl  # add/update recipes in bulk
+    python database.py --rebuild  # rebuild while the app is running
 """
 
+from contextlib import contextmanager
+import csv
 import sqlite3
 import json
 import os
+import sys
+import time
+
+# fcntl is POSIX-only; on Windows the startup lock is skipped
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 DATABASE = os.path.join(os.path.dirname(__file__), 'recipes.db')
 
+# Stored in PRAGMA user_version once a database has the current schema,
+# so app startup can skip migrate_database(). Bump it whenever
+# create_tables() / migrate_database() change.
+SCHEMA_VERSION = 2
+
+# Difficulty levels in increasing order. Stored in recipes.difficulty_rank
+# so the "max difficulty" filter is a plain indexed comparison.
+# Unknown difficulty values are treated as "medium".
+DIFFICULTY_RANK = {'easy': 1, 'medium': 2, 'hard': 3}
+
+# Nutrition values that also get their own typed, per-serving column
+NUTRITION_COLUMNS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+# Accepted values of recipes.dietary
+DIETARY_TYPES = ('regular', 'vegetarian', 'vegan')
+
+# Recipes written per executemany() / transaction by --import
+IMPORT_BATCH_SIZE = 5000
+
+# Columns a recipe is written from (see RecipeWriter); every other
+# recipes column is derived from these, or is a rating column
+SOURCE_COLUMNS = (
+    'name', 'description', 'ingredients', 'instructions', 'cook_time', 'difficulty',
+    'dietary', 'servings', 'cuisine', 'image_url', 'nutrition', 'substitutions'
+)
+
+# Secondary indexes and per-row triggers that --import drops while it
+# writes and rebuilds once at the end (one sorted build beats updating
+# the b-trees row by row). They are recreated by the create_* functions.
+# Without the full-text and version triggers, the FTS index is rebuilt
+# in one pass and content_version moves once per import, so workers
+# reload the catalogue once instead of after every batch. The ratings
+# trigger stays, since the app keeps taking votes meanwhile.
+DEFERRED_INDEXES = (
+    'idx_recipes_filters', 'idx_recipes_calories', 'idx_recipes_protein',
+    'idx_recipe_ingredients_ingredient',
+)
+DEFERRED_TRIGGERS = (
+    'recipes_nutrition_insert', 'recipes_nutrition_update',
+    'recipes_fts_insert', 'recipes_fts_delete', 'recipes_fts_update',
+    'recipes_version_insert', 'recipes_version_delete', 'recipes_version_update',
+)
+
 
 def create_tables(cursor):
     """
-    Create the recipes table.
+    Create the recipes table and its ingredient lookup tables.
     We store ingredients, nutrition, and substitutions as JSON strings
     because SQLite doesn't have native array/object types.
-    This keeps things simple — no need for junction tables.
+
+    The ingredient list is also normalized into an `ingredients` table
+    plus a `recipe_ingredients` junction table, so SQLite can index
+    ingredients and count matches with a GROUP BY during search.
+    Names, descriptions and instructions also get a full-text index.
     """
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS recipes (
@@ -31,22 +91,346 @@ def create_tables(cursor):
             instructions TEXT NOT NULL,
             cook_time INTEGER NOT NULL,      -- in minutes
             difficulty TEXT NOT NULL,         -- "easy", "medium", "hard"
+            difficulty_rank INTEGER NOT NULL DEFAULT 2,  -- 1 = easy, 2 = medium, 3 = hard
             dietary TEXT NOT NULL,            -- "regular", "vegetarian", "vegan"
             servings INTEGER NOT NULL,
             cuisine TEXT,
             image_url TEXT,
             nutrition TEXT NOT NULL,          -- JSON object with nutritional info
             substitutions TEXT NOT NULL,      -- JSON object: ingredient -> substitute
-            rating REAL DEFAULT 0.0,
-            rating_count INTEGER DEFAULT 0
+            rating REAL DEFAULT 0.0,          -- average, always rating_sum / rating_count
+            rating_count INTEGER DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,  -- total of all votes
+            ingredient_count INTEGER NOT NULL DEFAULT 0,  -- length of the ingredients list
+            calories REAL,                    -- per serving, filled from nutrition
+            protein REAL,
+            carbs REAL,
+            fat REAL,
+            fiber REAL
         )
     ''')
+    create_filter_index(cursor)
+    create_nutrition_columns(cursor)
+    create_ingredient_tables(cursor)
+    create_text_index(cursor)
+    create_catalog_version(cursor)
+    create_applied_segments(cursor)
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
 
 
-def seed_recipes(cursor):
+def create_filter_index(cursor):
+    """
+    Index the search filter columns (dietary, max difficulty, max time)
+    so filtered-out recipes are skipped inside SQLite.
+    """
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recipes_filters
+        ON recipes (dietary, difficulty_rank, cook_time)
+    ''')
+
+
+def create_nutrition_columns(cursor):
+    """
+    Keep typed per-serving nutrition columns next to the JSON `nutrition`.
+
+    The JSON object holds totals for the recipe's `servings`. The
+    columns hold the same values divided by servings, so scaling is one
+    multiplication per value and SQL can filter on them with an index
+    (e.g. calories <= 500). Triggers refill the columns whenever a
+    recipe is inserted or its nutrition/servings change.
+    """
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(recipes)')]
+    for column in NUTRITION_COLUMNS:
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE recipes ADD COLUMN {column} REAL')
+
+    def per_serving(row):
+        return ', '.join(
+            f"{column} = json_extract({row}.nutrition, '$.{column}') * 1.0 / {row}.servings"
+            for column in NUTRITION_COLUMNS
+        )
+
+    # Backfill existing rows (a no-op once every row is filled)
+    cursor.execute(f'UPDATE recipes SET {per_serving("recipes")} WHERE calories IS NULL')
+
+    fill = f'UPDATE recipes SET {per_serving("NEW")} WHERE id = NEW.id;'
+    triggers = {
+        'recipes_nutrition_insert': f'AFTER INSERT ON recipes BEGIN {fill} END',
+        'recipes_nutrition_update': f'''
+            AFTER UPDATE OF nutrition, servings ON recipes
+            BEGIN {fill} END''',
+    }
+    for name, body in triggers.items():
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+    # Indexes for the max_calories / min_protein search filters
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipes_calories ON recipes (calories)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipes_protein ON recipes (protein)')
+
+
+def create_ingredient_tables(cursor):
+    """
+    Create the normalized ingredient tables and their indexes.
+
+    `ingredients` holds each distinct (lowercased) ingredient name once.
+    `recipe_ingredients` links recipes to ingredients; `position` keeps
+    the original list order and lets a recipe list an ingredient twice.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE         -- lowercased ingredient name
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recipe_ingredients (
+            recipe_id INTEGER NOT NULL REFERENCES recipes(id),
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients(id),
+            position INTEGER NOT NULL,        -- index in the recipe's ingredient list
+            PRIMARY KEY (recipe_id, position)
+        )
+    ''')
+    # Search looks recipes up by ingredient, so index that direction too
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient
+        ON recipe_ingredients (ingredient_id, recipe_id)
+    ''')
+
+
+def create_text_index(cursor):
+    """
+    Create the `recipes_fts` full-text index and the triggers that keep it in sync.
+
+    It's an FTS5 "external content" table: SQLite stores only the index
+    of the words in each recipe's name, description and instructions,
+    and reads the text itself from `recipes` when it needs it (for
+    snippets). Words are stemmed ("roasted" finds "roast").
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'recipes_fts'"
+    ).fetchone()
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+            name, description, instructions,
+            content='recipes', content_rowid='id',
+            tokenize='porter unicode61'
+        )
+    ''')
+    if not exists:
+        # Index the recipes that are already there
+        cursor.execute("INSERT INTO recipes_fts (recipes_fts) VALUES ('rebuild')")
+
+    # External content tables are updated by hand: 'delete' removes the
+    # old words (it needs the old values), a plain insert adds the new ones
+    add = '''INSERT INTO recipes_fts (rowid, name, description, instructions)
+             VALUES (NEW.id, NEW.name, NEW.description, NEW.instructions);'''
+    remove = '''INSERT INTO recipes_fts (recipes_fts, rowid, name, description, instructions)
+                VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.instructions);'''
+    triggers = {
+        'recipes_fts_insert': f'AFTER INSERT ON recipes BEGIN {add} END',
+        'recipes_fts_delete': f'AFTER DELETE ON recipes BEGIN {remove} END',
+        'recipes_fts_update': f'''
+            AFTER UPDATE OF name, description, instructions ON recipes
+            BEGIN {remove} {add} END''',
+    }
+    for name, body in triggers.items():
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+def create_catalog_version(cursor):
+    """
+    Create the `catalog_version` table and the triggers that bump it.
+
+    The app caches recipes in memory (see catalog.py) and checks these
+    counters to know when its copy is stale:
+      content_version -> bumped when a recipe is added, removed or edited
+      ratings_version -> bumped when only the rating columns change
+      updated_at      -> unix time of the last change (HTTP Last-Modified)
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),   -- always exactly one row
+            content_version INTEGER NOT NULL DEFAULT 0,
+            ratings_version INTEGER NOT NULL DEFAULT 0,
+            updated_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+        )
+    ''')
+    now = "CAST(strftime('%s', 'now') AS INTEGER)"
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(catalog_version)')]
+    if 'updated_at' not in columns:
+        cursor.execute(
+            'ALTER TABLE catalog_version ADD COLUMN updated_at INTEGER NOT NULL DEFAULT 0'
+        )
+        cursor.execute(f'UPDATE catalog_version SET updated_at = {now}')
+    cursor.execute('INSERT OR IGNORE INTO catalog_version (id) VALUES (1)')
+
+    # Triggers are dropped and recreated so their definitions follow the schema
+    bump_content = (
+        f'UPDATE catalog_version SET content_version = content_version + 1, updated_at = {now};'
+    )
+    bump_ratings = (
+        f'UPDATE catalog_version SET ratings_version = ratings_version + 1, updated_at = {now};'
+    )
+    triggers = {
+        'recipes_version_insert': f'AFTER INSERT ON recipes BEGIN {bump_content} END',
+        'recipes_version_delete': f'AFTER DELETE ON recipes BEGIN {bump_content} END',
+        'recipes_version_update': f'''
+            AFTER UPDATE OF name, description, ingredients, instructions, cook_time,
+                            difficulty, dietary, servings, cuisine, image_url,
+                            nutrition, substitutions ON recipes
+            BEGIN {bump_content} END''',
+        'recipes_version_rating': f'''
+            AFTER UPDATE OF rating, rating_count, rating_sum ON recipes
+            BEGIN {bump_ratings} END''',
+    }
+    for name, body in triggers.items():
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'CREATE TRIGGER {name} {body}')
+
+
+def create_applied_segments(cursor):
+    """
+    Create the `applied_segments` table: names of rating spill files
+    (see ratings.py) whose votes are already in `recipes`. A name is
+    added in the same transaction as the votes, so a file left behind by
+    a crash right after that commit is deleted instead of replayed.
+    """
+    cursor.execute('CREATE TABLE IF NOT EXISTS applied_segments (name TEXT PRIMARY KEY)')
+
+
+def schema_version(path):
+    """Return the schema version of a database file (0 for older databases)."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+@contextmanager
+def schema_lock(path):
+    """
+    Hold an exclusive lock on `path` + '.lock' while creating or
+    migrating a database, so several app workers starting at once take
+    turns instead of racing each other.
+    """
+    with open(path + '.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_database(path):
+    """
+    Make sure `path` holds a database with the current schema: create
+    and seed it if it's missing, migrate it if it's older. Safe to call
+    from every worker at startup. Returns what was done: "created",
+    "migrated" or None.
+    """
+    with schema_lock(path):
+        if not os.path.exists(path):
+            # Build it under a temporary name and rename it into place,
+            # so nobody ever opens a half-created database
+            tmp_path = path + '.tmp'
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            conn = sqlite3.connect(tmp_path)
+            create_tables(conn.cursor())
+            seed_recipes(conn.cursor())
+            conn.commit()
+            conn.close()
+            os.replace(tmp_path, path)
+            return 'created'
+
+        if schema_version(path) >= SCHEMA_VERSION:
+            return None
+        conn = sqlite3.connect(path, timeout=30)
+        migrate_database(conn.cursor())
+        conn.commit()
+        conn.close()
+        return 'migrated'
+
+
+def add_recipe_ingredients(cursor, recipe_id, ingredients):
+    """
+    Link a recipe to its ingredients in the normalized tables.
+    New ingredient names are added to `ingredients` on the fly.
+    """
+    for position, name in enumerate(ingredients):
+        name = name.lower()
+        cursor.execute('INSERT OR IGNORE INTO ingredients (name) VALUES (?)', (name,))
+        ingredient_id = cursor.execute(
+            'SELECT id FROM ingredients WHERE name = ?', (name,)
+        ).fetchone()[0]
+        cursor.execute(
+            'INSERT INTO recipe_ingredients (recipe_id, ingredient_id, position) VALUES (?, ?, ?)',
+            (recipe_id, ingredient_id, position)
+        )
+    cursor.execute(
+        'UPDATE recipes SET ingredient_count = ? WHERE id = ?',
+        (len(ingredients), recipe_id)
+    )
+
+
+def migrate_database(cursor):
+    """
+    Bring an existing database up to the current schema.
+
+    Older databases only have the JSON `ingredients` column, so we add
+    the new column and tables, then backfill the junction table for
+    any recipe that isn't linked yet. Safe to run more than once.
+    """
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(recipes)')]
+    if 'ingredient_count' not in columns:
+        cursor.execute(
+            'ALTER TABLE recipes ADD COLUMN ingredient_count INTEGER NOT NULL DEFAULT 0'
+        )
+    if 'rating_sum' not in columns:
+        # Older databases only kept a rounded average; rebuild the total from it
+        cursor.execute(
+            'ALTER TABLE recipes ADD COLUMN rating_sum INTEGER NOT NULL DEFAULT 0'
+        )
+        cursor.execute(
+            'UPDATE recipes SET rating_sum = CAST(round(rating * rating_count) AS INTEGER)'
+        )
+    if 'difficulty_rank' not in columns:
+        cursor.execute(
+            'ALTER TABLE recipes ADD COLUMN difficulty_rank INTEGER NOT NULL DEFAULT 2'
+        )
+        for difficulty, rank in DIFFICULTY_RANK.items():
+            cursor.execute(
+                'UPDATE recipes SET difficulty_rank = ? WHERE difficulty = ?',
+                (rank, difficulty)
+            )
+    create_filter_index(cursor)
+    create_nutrition_columns(cursor)
+    create_ingredient_tables(cursor)
+    create_text_index(cursor)
+    create_catalog_version(cursor)
+    create_applied_segments(cursor)
+
+    # Backfill recipes that have no rows in recipe_ingredients yet
+    unlinked = cursor.execute('''
+        SELECT id, ingredients FROM recipes
+        WHERE id NOT IN (SELECT DISTINCT recipe_id FROM recipe_ingredients)
+    ''').fetchall()
+    for recipe_id, ingredients in unlinked:
+        add_recipe_ingredients(cursor, recipe_id, json.loads(ingredients))
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return len(unlinked)
+
+
+def seed_recipes(cursor, reuse_ids=None):
     """
     Insert 20 sample recipes into the database.
     Each recipe has realistic ingredients, nutrition, and substitution info.
+    `reuse_ids` ({name: id}) keeps recipe ids stable across a rebuild.
     """
     recipes = [
         # ── Recipe 1: Classic Spaghetti Bolognese ──────────
@@ -351,36 +735,508 @@ def seed_recipes(cursor):
         }
     ]
 
-    # Insert each recipe into the database
-    for recipe in recipes:
-        cursor.execute('''
-            INSERT INTO recipes (name, description, ingredients, instructions, cook_time,
-                               difficulty, dietary, servings, cuisine, image_url,
-                               nutrition, substitutions, rating, rating_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+    # Insert them all in one batch (see RecipeWriter)
+    RecipeWriter(cursor, reuse_ids).write(recipes)
+
+
+# ── Bulk Import ───────────────────────────────────────────
+# `python database.py --import FILE` streams recipes from JSON Lines or
+# CSV into an existing database (creating it if needed). A recipe whose
+# name is already in the database is updated in place, keeping its id
+# and ratings; other recipes are added.
+
+def validate_recipe(raw):
+    """
+    Check one imported recipe and return it in the shape the recipes
+    table expects, or raise ValueError. CSV cells arrive as strings, so
+    numbers are converted and the JSON columns are decoded here.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('recipe must be a JSON object')
+
+    def json_value(key, default, kind):
+        value = raw.get(key) or default
+        if isinstance(value, str):
+            value = json.loads(value)
+        if not isinstance(value, kind):
+            raise ValueError(f'{key} must be a JSON {kind.__name__}')
+        return value
+
+    name = (raw.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+
+    ingredients = raw.get('ingredients')
+    if isinstance(ingredients, str) and not ingredients.lstrip().startswith('['):
+        ingredients = ingredients.split(';')  # CSV: "onion; garlic; rice"
+    else:
+        ingredients = json_value('ingredients', [], list)
+    ingredients = [str(ing).strip() for ing in ingredients if str(ing).strip()]
+    if not ingredients:
+        raise ValueError('ingredients must list at least one ingredient')
+
+    instructions = (raw.get('instructions') or '').strip()
+    if not instructions:
+        raise ValueError('instructions are required')
+
+    def integer(key):
+        value = raw.get(key)
+        if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+            value = int(value)  # CSV cell
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError('cook_time and servings must be integers')
+        return value
+
+    cook_time = integer('cook_time')
+    servings = integer('servings')
+    if cook_time < 1 or servings < 1:
+        raise ValueError('cook_time and servings must be positive')
+
+    difficulty = (raw.get('difficulty') or '').strip().lower()
+    if difficulty not in DIFFICULTY_RANK:
+        raise ValueError('difficulty must be one of: ' + ', '.join(DIFFICULTY_RANK))
+    dietary = (raw.get('dietary') or 'regular').strip().lower()
+    if dietary not in DIETARY_TYPES:
+        raise ValueError('dietary must be one of: ' + ', '.join(DIETARY_TYPES))
+
+    nutrition = json_value('nutrition', {}, dict)
+    for key, value in nutrition.items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f'nutrition value for {key} must be a number')
+    substitutions = json_value('substitutions', {}, dict)
+
+    return {
+        'name': name,
+        'description': (raw.get('description') or '').strip(),
+        'ingredients': ingredients,
+        'instructions': instructions,
+        'cook_time': cook_time,
+        'difficulty': difficulty,
+        'dietary': dietary,
+        'servings': servings,
+        'cuisine': (raw.get('cuisine') or '').strip(),
+        'image_url': (raw.get('image_url') or '').strip(),
+        'nutrition': nutrition,
+        'substitutions': {str(k): str(v) for k, v in substitutions.items()},
+    }
+
+
+def read_recipes(path):
+    """
+    Yield (line number, raw recipe) from a JSON Lines or CSV file,
+    picked by extension (.csv is CSV, anything else JSON Lines).
+    A line that isn't valid JSON is yielded as its error message.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith('.csv'):
+            # Line 1 is the header row
+            for number, row in enumerate(csv.DictReader(f), start=2):
+                yield number, row
+            return
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, f'invalid JSON ({e})'
+
+
+class RecipeWriter:
+    """
+    Writes batches of validated recipes with executemany().
+
+    Recipe and ingredient ids are handed out here rather than read back
+    after each INSERT, so every table is filled with one executemany()
+    per batch. Existing recipes are matched by name (the natural key)
+    and updated without touching their rating columns. New recipes
+    named in `reuse_ids` ({name: id}) get that id back (see --rebuild).
+    """
+
+    def __init__(self, cursor, reuse_ids=None):
+        self.cursor = cursor
+        self.reuse_ids = reuse_ids or {}
+        self.recipe_ids = {name: recipe_id for recipe_id, name in cursor.execute(
+            'SELECT id, name FROM recipes ORDER BY id'
+        )}
+        self.ingredient_ids = {name: ingredient_id for ingredient_id, name in cursor.execute(
+            'SELECT id, name FROM ingredients'
+        )}
+        self.next_recipe_id = cursor.execute(
+            "SELECT MAX(COALESCE((SELECT MAX(id) FROM recipes), 0), "
+            "COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'recipes'), 0)) + 1"
+        ).fetchone()[0]
+        self.next_recipe_id = max(self.next_recipe_id, max(self.reuse_ids.values(), default=0) + 1)
+        self.used_ids = set(self.recipe_ids.values())
+        self.next_ingredient_id = max(self.ingredient_ids.values(), default=0) + 1
+
+    def write(self, recipes):
+        """Insert or update a batch of recipes. Returns (inserted, updated)."""
+        # One entry per name: a later copy in the same batch wins
+        batch = {recipe['name']: recipe for recipe in recipes}
+
+        inserts, updates, links, new_ingredients = [], [], [], []
+        for name, recipe in batch.items():
+            recipe_id = self.recipe_ids.get(name)
+            if recipe_id is None:
+                recipe_id = self.reuse_ids.get(name)
+                if recipe_id is None or recipe_id in self.used_ids:
+                    recipe_id = self.next_recipe_id
+                    self.next_recipe_id += 1
+                self.recipe_ids[name] = recipe_id
+                self.used_ids.add(recipe_id)
+                inserts.append(self._row(recipe) + (recipe_id,))
+            else:
+                updates.append(self._row(recipe) + (recipe_id,))
+
+            for position, ingredient in enumerate(recipe['ingredients']):
+                ingredient = ingredient.lower()
+                ingredient_id = self.ingredient_ids.get(ingredient)
+                if ingredient_id is None:
+                    ingredient_id = self.next_ingredient_id
+                    self.next_ingredient_id += 1
+                    self.ingredient_ids[ingredient] = ingredient_id
+                    new_ingredients.append((ingredient_id, ingredient))
+                links.append((recipe_id, ingredient_id, position))
+
+        columns = (
+            'name, description, ingredients, instructions, cook_time, difficulty, '
+            'difficulty_rank, dietary, servings, cuisine, image_url, nutrition, '
+            'substitutions, ingredient_count, ' + ', '.join(NUTRITION_COLUMNS)
+        )
+        placeholders = ', '.join('?' * (len(columns.split(',')) + 1))
+        self.cursor.executemany(
+            f'INSERT INTO recipes ({columns}, id) VALUES ({placeholders})', inserts
+        )
+        assignments = ', '.join(f'{column.strip()} = ?' for column in columns.split(','))
+        self.cursor.executemany(f'UPDATE recipes SET {assignments} WHERE id = ?', updates)
+
+        self.cursor.executemany('INSERT INTO ingredients (id, name) VALUES (?, ?)', new_ingredients)
+        self.cursor.executemany(
+            'DELETE FROM recipe_ingredients WHERE recipe_id = ?', [(row[-1],) for row in updates]
+        )
+        self.cursor.executemany(
+            'INSERT INTO recipe_ingredients (recipe_id, ingredient_id, position) VALUES (?, ?, ?)',
+            links
+        )
+        return len(inserts), len(updates)
+
+    @staticmethod
+    def _row(recipe):
+        """Column values for one recipe, in the order used by write()."""
+        nutrition = recipe['nutrition']
+        per_serving = tuple(
+            nutrition[column] / recipe['servings'] if column in nutrition else None
+            for column in NUTRITION_COLUMNS
+        )
+        return (
             recipe['name'],
             recipe['description'],
             json.dumps(recipe['ingredients']),
             recipe['instructions'],
             recipe['cook_time'],
             recipe['difficulty'],
+            DIFFICULTY_RANK.get(recipe['difficulty'], 2),
             recipe['dietary'],
             recipe['servings'],
             recipe['cuisine'],
             recipe['image_url'],
             json.dumps(recipe['nutrition']),
             json.dumps(recipe['substitutions']),
-            0.0,  # Starting rating
-            0     # No ratings yet
-        ))
+            len(recipe['ingredients']),
+        ) + per_serving
+
+
+def import_recipes(conn, path, batch_size=IMPORT_BATCH_SIZE, log=print, reuse_ids=None):
+    """
+    Stream recipes from `path` into the database, `batch_size` at a time.
+    Each batch is one executemany() per table and one transaction.
+    Invalid recipes are skipped and reported. Returns a stats dict.
+    """
+    cursor = conn.cursor()
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipes'"
+    ).fetchone()
+    if exists:
+        migrate_database(cursor)
+    else:
+        create_tables(cursor)
+
+    for name in DEFERRED_INDEXES:
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    for name in DEFERRED_TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    conn.commit()
+
+    writer = RecipeWriter(cursor, reuse_ids)
+    stats = {'read': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        inserted, updated = writer.write(batch)
+        conn.commit()
+        stats['inserted'] += inserted
+        stats['updated'] += updated
+        batch.clear()
+
+    try:
+        for number, raw in read_recipes(path):
+            stats['read'] += 1
+            try:
+                if isinstance(raw, str):
+                    raise ValueError(raw)
+                batch.append(validate_recipe(raw))
+            except ValueError as e:
+                stats['skipped'] += 1
+                if stats['skipped'] <= 10:
+                    log(f'  line {number}: skipped, {e}')
+                continue
+            if len(batch) >= batch_size:
+                flush()
+                log(f"  {stats['read']} recipes read...")
+        if batch:
+            flush()
+    finally:
+        # Rebuild what was dropped above, even if the import stopped
+        # early: one sorted index build per index instead of row-by-row.
+        create_filter_index(cursor)
+        create_nutrition_columns(cursor)
+        create_ingredient_tables(cursor)
+        create_text_index(cursor)
+        cursor.execute("INSERT INTO recipes_fts (recipes_fts) VALUES ('rebuild')")
+        create_catalog_version(cursor)
+        cursor.execute('''
+            UPDATE catalog_version
+            SET content_version = content_version + 1,
+                updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+        ''')
+        conn.commit()
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def run_import(path, batch_size=IMPORT_BATCH_SIZE):
+    """Command-line entry point for --import: run it and report throughput."""
+    conn = sqlite3.connect(DATABASE)
+    conn.execute('PRAGMA journal_mode = WAL')    # don't block running app workers
+    conn.execute('PRAGMA synchronous = NORMAL')  # one fsync per checkpoint, not per commit
+    try:
+        print(f'Importing recipes from {path}...')
+        stats = import_recipes(conn, path, batch_size)
+    finally:
+        conn.close()
+
+    written = stats['inserted'] + stats['updated']
+    rate = written / stats['seconds'] if stats['seconds'] else 0
+    print(f"Added {stats['inserted']}, updated {stats['updated']}, "
+          f"skipped {stats['skipped']} of {stats['read']} recipe(s) "
+          f"in {stats['seconds']:.2f}s ({rate:,.0f} rows/sec).")
+
+
+# ── Zero-Downtime Rebuild ─────────────────────────────────
+# `python database.py --rebuild [--import FILE]` rebuilds the catalogue
+# while the app keeps serving. Removing and recreating recipes.db would
+# pull the file out from under running workers (and lose every rating),
+# so instead:
+#
+#   1. copy the live database to recipes.db.new with SQLite's online
+#      backup API (a consistent snapshot, ratings included, taken
+#      without blocking the app),
+#   2. rebuild the recipe tables in that shadow copy from the recipes
+#      already in it (so earlier imports are kept), the sample recipes
+#      and the optional import file, keeping each recipe's id and
+#      ratings (matched by name), and
+#   3. copy the shadow back over the live database, again with the
+#      backup API, as a single write transaction. Its first step locks
+#      the live database for writes; the votes cast since step 1 are
+#      added to the shadow right then, so none are lost.
+#
+# Step 3 is the swap. Renaming the shadow file into place is not safe
+# while workers have the database open in WAL mode: their -wal/-shm
+# files would be shared with the new file. Going through SQLite keeps
+# every open connection valid; workers see the bumped catalog_version
+# and reload their caches on their next request.
+
+def rebuild_catalogue(cursor, import_path=None):
+    """
+    Recreate the recipe tables of a database in place, together with
+    everything derived from them (ingredient tables, per-serving
+    nutrition, the full-text index). The current recipes are written
+    back first, then the sample recipes and the recipes in
+    `import_path` (if given) are added or updated by name. Every recipe
+    keeps its id and ratings. Returns the ratings that were carried
+    over, as {id: (rating_sum, rating_count)}.
+    """
+    migrate_database(cursor)
+    kept = cursor.execute(
+        'SELECT id, name, rating_sum, rating_count FROM recipes'
+    ).fetchall()
+    current = [
+        dict(zip(SOURCE_COLUMNS, row))
+        for row in cursor.execute(f"SELECT {', '.join(SOURCE_COLUMNS)} FROM recipes ORDER BY id")
+    ]
+    for recipe in current:
+        for column, default in (('ingredients', []), ('nutrition', {}), ('substitutions', {})):
+            recipe[column] = json.loads(recipe[column] or 'null') or default
+    cursor.execute('CREATE TEMP TABLE kept_ratings (id INTEGER PRIMARY KEY, name TEXT, '
+                   'rating_sum INTEGER, rating_count INTEGER)')
+    cursor.executemany('INSERT INTO kept_ratings VALUES (?, ?, ?, ?)', kept)
+
+    # Dropping a table drops its triggers and indexes too;
+    # catalog_version stays, so the version counters keep counting up
+    for table in ('recipes_fts', 'recipe_ingredients', 'ingredients', 'recipes'):
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('recipes', 'ingredients')")
+    create_tables(cursor)
+
+    reuse_ids = {name: recipe_id for recipe_id, name, _, _ in kept}
+    writer = RecipeWriter(cursor, reuse_ids)
+    for start in range(0, len(current), IMPORT_BATCH_SIZE):
+        writer.write(current[start:start + IMPORT_BATCH_SIZE])
+    seed_recipes(cursor, reuse_ids)
+    cursor.connection.commit()
+    print(f"Kept {len(current)} existing recipe(s).")
+    if import_path:
+        stats = import_recipes(cursor.connection, import_path, reuse_ids=reuse_ids)
+        print(f"Imported {stats['inserted'] + stats['updated']} recipe(s), "
+              f"skipped {stats['skipped']}.")
+
+    cursor.execute('''
+        UPDATE recipes
+        SET rating_sum = k.rating_sum,
+            rating_count = k.rating_count,
+            rating = CASE WHEN k.rating_count > 0
+                          THEN k.rating_sum * 1.0 / k.rating_count ELSE 0.0 END
+        FROM kept_ratings AS k
+        WHERE recipes.id = k.id AND recipes.name = k.name
+    ''')
+    cursor.execute('DROP TABLE kept_ratings')
+    cursor.connection.commit()
+    return {recipe_id: (total, count) for recipe_id, _, total, count in kept}
+
+
+def catch_up_ratings(shadow, live, snapshot):
+    """
+    Add to the shadow database the votes the live database received
+    since `snapshot` ({id: (rating_sum, rating_count)}) was taken.
+    Returns the number of recipes that got new votes.
+    """
+    deltas = []
+    for recipe_id, total, count in live.execute(
+        'SELECT id, rating_sum, rating_count FROM recipes'
+    ):
+        old_total, old_count = snapshot.get(recipe_id, (0, 0))
+        if count != old_count:
+            deltas.append({'sum': total - old_total, 'count': count - old_count, 'id': recipe_id})
+    # Same arithmetic as ratings.add_rating(), for several votes at once
+    shadow.executemany('''
+        UPDATE recipes
+        SET rating_sum = rating_sum + :sum,
+            rating_count = rating_count + :count,
+            rating = (rating_sum + :sum) * 1.0 / NULLIF(rating_count + :count, 0)
+        WHERE id = :id
+    ''', deltas)
+    return len(deltas)
+
+
+def swap_in(shadow, shadow_path, live, snapshot):
+    """
+    Copy the shadow database over the live one with the backup API.
+
+    The live write lock is taken by the first backup step and held until
+    the copy is done. Right after that step the votes cast since
+    `snapshot` are added to the shadow and its version counters are
+    moved past the live ones (so every worker reloads). Changing the
+    shadow through another connection makes SQLite restart the copy,
+    which then includes those last votes. Returns the number of recipes
+    that got votes during the rebuild.
+    """
+    writer = sqlite3.connect(shadow_path)
+    reader = sqlite3.connect(DATABASE)
+    caught_up = []
+
+    def after_step(status, remaining, total):
+        if caught_up:
+            return
+        caught_up.append(catch_up_ratings(writer, reader, snapshot))
+        # Spill files applied meanwhile (see ratings.py) stay marked as applied
+        if reader.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'applied_segments'"
+        ).fetchone():
+            writer.executemany(
+                'INSERT OR IGNORE INTO applied_segments (name) VALUES (?)',
+                reader.execute('SELECT name FROM applied_segments').fetchall()
+            )
+        content, ratings = reader.execute(
+            'SELECT content_version, ratings_version FROM catalog_version'
+        ).fetchone()
+        writer.execute('''
+            UPDATE catalog_version
+            SET content_version = MAX(content_version, ?) + 1,
+                ratings_version = MAX(ratings_version, ?) + 1,
+                updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+        ''', (content, ratings))
+        writer.commit()
+
+    # At least two steps, so the catch-up runs before the copy finishes
+    page_count = shadow.execute('PRAGMA page_count').fetchone()[0]
+    try:
+        shadow.backup(live, pages=max(1, min(1024, page_count // 2)), progress=after_step)
+    finally:
+        writer.close()
+        reader.close()
+    return caught_up[0]
+
+
+def rebuild_database(import_path=None):
+    """Rebuild the catalogue in a shadow copy and swap it in while the app runs."""
+    if not os.path.exists(DATABASE):
+        print("No database yet, creating a new one.")
+        initialize_database()
+        if import_path:
+            run_import(import_path)
+        return
+
+    started = time.perf_counter()
+    shadow_path = DATABASE + '.new'
+    for path in (shadow_path, shadow_path + '-wal', shadow_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    live = sqlite3.connect(DATABASE, timeout=30)
+    shadow = sqlite3.connect(shadow_path)
+    try:
+        print(f"Copying {DATABASE} to {shadow_path}...")
+        live.backup(shadow)
+
+        print("Rebuilding recipes in the shadow copy...")
+        snapshot = rebuild_catalogue(shadow.cursor(), import_path)
+        shadow.execute('VACUUM')
+
+        print("Swapping the new catalogue in...")
+        caught_up = swap_in(shadow, shadow_path, live, snapshot)
+    finally:
+        shadow.close()
+        live.close()
+    for path in (shadow_path, shadow_path + '-wal', shadow_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(f"Rebuilt {DATABASE} in {time.perf_counter() - started:.2f}s "
+          f"({caught_up} recipe(s) got votes during the rebuild).")
 
 
 def initialize_database():
     """Main function to create and populate the database."""
-    # Remove old database if it exists (fresh start)
+    # Remove old database if it exists (fresh start). Its WAL files go
+    # too, or SQLite would replay them into the new file. While the app
+    # is running use --rebuild instead.
     if os.path.exists(DATABASE):
-        os.remove(DATABASE)
+        for path in (DATABASE, DATABASE + '-wal', DATABASE + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
         print("Removed old database.")
 
     conn = sqlite3.connect(DATABASE)
@@ -398,6 +1254,47 @@ def initialize_database():
     print("You can now run the app with: python app.py")
 
 
+def upgrade_database():
+    """Migrate an existing database in place, keeping its data and ratings."""
+    conn = sqlite3.connect(DATABASE)
+    cursor = conn.cursor()
+
+    print("Migrating schema...")
+    with schema_lock(DATABASE):
+        backfilled = migrate_database(cursor)
+
+    conn.commit()
+    conn.close()
+    print(f"Backfilled ingredients for {backfilled} recipe(s).")
+
+
 # Run this script directly to initialize the database
+#   python database.py            -> fresh database with sample recipes
+#   python database.py --migrate  -> upgrade an existing database in place
+#   python database.py --import recipes.jsonl [--batch-size 5000]
+#                                 -> add or update recipes from JSON Lines / CSV
+#   python database.py --rebuild [--import recipes.jsonl]
+#                                 -> rebuild the catalogue while the app is running
 if __name__ == '__main__':
-    initialize_database()
+    args = sys.argv[1:]
+    if '--rebuild' in args:
+        import_path = None
+        if '--import' in args:
+            try:
+                import_path = args[args.index('--import') + 1]
+            except IndexError:
+                sys.exit('Usage: python database.py --rebuild [--import FILE]')
+        rebuild_database(import_path)
+    elif '--import' in args:
+        try:
+            path = args[args.index('--import') + 1]
+            batch_size = IMPORT_BATCH_SIZE
+            if '--batch-size' in args:
+                batch_size = int(args[args.index('--batch-size') + 1])
+        except (IndexError, ValueError):
+            sys.exit('Usage: python database.py --import FILE [--batch-size N]')
+        run_import(path, batch_size)
+    elif '--migrate' in args:
+        upgrade_database()
+    else:
+        initialize_database()
@@ -0,0 +1,203 @@
+"""
+SQLite Connection Pool
+======================
+A small, bounded pool of SQLite connections shared by the request
+threads of one worker process.
+
+Opening a connection for every request means re-opening the file,
+re-parsing the schema and starting with a cold page cache. Instead we
+keep up to `max_size` connections open and hand them out one request
+at a time. Every connection is configured once with pragmas tuned for
+a read-heavy web app (WAL journal, relaxed fsync, bigger cache, mmap).
+
+The pool is per process: gunicorn forks its workers, and a SQLite
+connection must never be shared across a fork, so a pool that notices
+it is running in a new process simply starts over.
+
+Likewise, if the database file is replaced by a different one (same
+path, new inode, e.g. after a fresh `python database.py`), connections
+to the old file are closed and new ones are opened. `generation`
+counts these swaps so callers can drop anything cached from the old
+file. (`python database.py --rebuild` updates the file in place, so it
+needs none of this.)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+# Pragmas applied to every new connection.
+#   journal_mode=WAL    -> readers don't block the writer (and vice versa)
+#   synchronous=NORMAL  -> safe with WAL, fsyncs only at checkpoints
+#   cache_size=-16000   -> ~16 MB page cache per connection (negative = KiB)
+#   mmap_size           -> read pages through a 64 MB memory map
+#   temp_store=MEMORY   -> temp tables and sort spills stay in RAM
+#   busy_timeout        -> wait up to 5 s for a lock instead of failing
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of SQLite connections.
+
+    acquire() hands out an idle connection (a "hit"), opens a new one
+    while we are below `max_size` (a "miss"), or waits for one to be
+    released (a "wait"). release() puts the connection back.
+    """
+
+    def __init__(self, path, max_size=8, timeout=10.0):
+        self.path = path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.generation = 0   # bumped whenever the database file is swapped
+        self.reopens = 0
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        """Forget all connections (used at start-up and after a fork)."""
+        self._pid = os.getpid()
+        self._idle = []
+        self._created = 0
+        self._inode = self._file_inode()
+        self._current = set()  # connections to the current file, idle or in use
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    def _file_inode(self):
+        """Return the inode of the database file, or None while it doesn't exist."""
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _check_file(self):
+        """Drop connections to the old file if the database file was replaced."""
+        inode = self._file_inode()
+        if inode is None or inode == self._inode:
+            return  # unchanged, or mid-swap: keep using what we have
+        if self._inode is None:
+            # The file didn't exist when the pool was created (first start,
+            # before init_db()); it appearing now is not a swap
+            self._inode = inode
+            return
+        for conn in self._idle:
+            conn.close()
+        # Connections still in use are closed when they come back
+        self._idle = []
+        self._created = 0
+        self._current = set()
+        self._inode = inode
+        self.generation += 1
+        self.reopens += 1
+        self._cond.notify_all()  # waiters can open connections to the new file
+
+    def _connect(self):
+        """Open and configure a new connection."""
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # So we can access columns by name
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Borrow a connection from the pool."""
+        with self._cond:
+            if self._pid != os.getpid():
+                # We were forked: the parent's connections aren't ours to use
+                self._reset()
+            self._check_file()
+
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+
+            if self._created >= self.max_size:
+                self.waits += 1
+                deadline = time.monotonic() + self.timeout
+                # A slot can also free up (file swap, failed connect, stale
+                # connection closed on release), so wait for either
+                while not self._idle and self._created >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        raise PoolTimeout('No database connection available')
+                if self._idle:
+                    return self._idle.pop()
+
+            self.misses += 1
+            self._created += 1
+            generation = self.generation
+
+        # Open the connection outside the lock so other threads aren't blocked
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                if generation == self.generation:
+                    self._created -= 1
+                    self._cond.notify()
+            raise
+        with self._cond:
+            if generation == self.generation:
+                self._current.add(conn)
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            if self._pid != os.getpid() or conn not in self._current:
+                # Forked, or opened on a database file that has since been replaced
+                conn.close()
+                self._cond.notify()  # a waiter may open a new connection instead
+                return
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def warm(self, count=None):
+        """
+        Open `count` connections (default: max_size) ahead of time, so
+        the first requests after startup don't pay for opening them.
+        """
+        count = min(count or self.max_size, self.max_size)
+        conns = [self.acquire() for _ in range(count)]
+        for conn in conns:
+            self.release(conn)
+        return count
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+                self._current.discard(conn)
+            self._created -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        """Return the pool counters as a dict."""
+        with self._cond:
+            return {
+                'size': self._created,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'reopens': self.reopens,
+            }
@@ -0,0 +1,18 @@
+"""
+Gunicorn Configuration
+======================
+Loaded automatically when gunicorn starts from this directory
+(see Procfile and render.yaml).
+"""
+
+
+def worker_exit(server, worker):
+    """
+    Flush any queued (write-behind) ratings and stop the batch search
+    processes before the worker goes away.
+    """
+    from app import rating_queue
+    from search_batch import shutdown_executor
+    if rating_queue is not None:
+        rating_queue.close()
+    shutdown_executor()
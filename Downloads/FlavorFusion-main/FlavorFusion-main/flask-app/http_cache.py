@@ -0,0 +1,100 @@
+"""
+Prepared HTTP Responses
+=======================
+Serialize a response body once and serve it many times.
+
+A PreparedResponse keeps the JSON bytes together with a strong ETag
+(a hash of the body) and a Last-Modified time. Compressed copies
+(gzip, and brotli when the optional `brotli` package is installed)
+are made on first request and reused afterwards. Clients that send a matching If-None-Match (or an
+up-to-date If-Modified-Since) get an empty 304 instead of the body.
+"""
+
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import threading
+
+from flask import Response
+
+# Brotli is optional: without it we simply offer gzip only.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _gzip(body):
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=5)
+
+
+# Content-Encoding -> compressor, in order of preference
+COMPRESSORS = {'br': _brotli, 'gzip': _gzip} if brotli else {'gzip': _gzip}
+
+
+class PreparedResponse:
+    """A serialized body plus its validators and compressed variants."""
+
+    def __init__(self, body, last_modified, mimetype='application/json'):
+        """`last_modified` is a unix timestamp (HTTP dates have 1 s resolution)."""
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+        self._encoded = {'identity': body}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        """Return the body in the given Content-Encoding, compressing it once."""
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = COMPRESSORS[encoding](self.body)
+                    self._encoded[encoding] = data
+        return data
+
+    def etag_for(self, encoding):
+        """
+        Strong ETag for one encoding. Each compressed variant is a
+        different byte sequence, so it gets its own tag.
+        """
+        return self.etag if encoding == 'identity' else f'{self.etag}-{encoding}'
+
+    def not_modified(self, request):
+        """Check the request's conditional headers against our validators."""
+        if request.if_none_match:
+            return any(
+                request.if_none_match.contains_weak(self.etag_for(encoding))
+                for encoding in self._variants()
+            )
+        if request.if_modified_since:
+            return self.last_modified <= request.if_modified_since
+        return False
+
+    def _variants(self):
+        return ['identity'] + list(COMPRESSORS)
+
+    def respond(self, request):
+        """Build the Flask response for this request (200 or 304)."""
+        encoding = request.accept_encodings.best_match(list(COMPRESSORS)) or 'identity'
+
+        if self.not_modified(request):
+            response = Response(status=304)
+        else:
+            response = Response(self.encoded(encoding), mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(self.etag_for(encoding))
+        response.last_modified = self.last_modified
+        # Let the browser keep a copy, but always revalidate it with us
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
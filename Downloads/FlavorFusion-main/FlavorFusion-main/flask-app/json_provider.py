@@ -0,0 +1,57 @@
+"""
+JSON Encoding
+=============
+Fast JSON for the app, with the standard library as a fallback.
+
+When the optional `orjson` package is installed, OrJSONProvider
+replaces Flask's default JSON provider, so jsonify(), request.get_json()
+and app.json.dumps() all go through orjson. Output keeps Flask's
+conventions: sorted keys, compact separators, a trailing newline on
+responses.
+
+loads() is the decoder used outside a request (for the JSON columns in
+catalog.py); it picks orjson too when available.
+"""
+
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional: without it everything uses the json module.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+HAVE_ORJSON = orjson is not None
+
+
+def loads(text):
+    """Decode JSON text (str or bytes)."""
+    return orjson.loads(text) if orjson else json.loads(text)
+
+
+class OrJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    # OPT_NON_STR_KEYS matches json.dumps, which turns int keys into strings
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Formatting options (indent=...) only exist in the json module
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            # Pretty-printed output in debug mode, like the default provider
+            return super().response(obj)
+        body = orjson.dumps(obj, default=self.default, option=self.option) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,73 @@
+"""
+LRU Cache
+=========
+A small thread-safe least-recently-used cache with hit/miss counters.
+
+functools.lru_cache only wraps functions, while we need to store
+values built inside request handlers and report how well the cache
+is doing, so this is a plain dict-like class instead.
+
+Entries can optionally expire `ttl` seconds after they were stored.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """Keep up to `maxsize` entries, evicting the least recently used."""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._data = OrderedDict()  # key -> (value, expiry time or None)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if it isn't cached (or expired)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a value, evicting the oldest entry if the cache is full."""
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry (the counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'size': len(self._data),
+                'max_size': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+            if self.ttl:
+                stats['ttl'] = self.ttl
+                stats['expired'] = self.expired
+            return stats
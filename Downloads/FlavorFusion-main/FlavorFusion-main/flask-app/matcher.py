@@ -0,0 +1,151 @@
+"""
+Ingredient Matcher
+==================
+Decides which recipe ingredients a user's ingredient list covers.
+
+Ingredient names are normalized into token sets once, when the
+catalogue loads: lowercased, split into words, and plurals reduced to
+a common stem ("Canned Tomatoes" -> {"canned", "tomato"}).
+
+A user term matches an ingredient when one token set contains the
+other:
+    "chicken"    matches "chicken breast"   (user tokens inside recipe's)
+    "brown rice" matches "rice"             (recipe tokens inside user's)
+    "oil"        does NOT match "foil", and "egg" does NOT match "eggplant"
+
+Plurals that need care in the stemmer (see stem()):
+    "berry"      matches "berries"
+    "chili"      matches "chilies" and "chilis"
+    "cookie"     matches "cookies"
+    "kiwi"       matches "kiwis"            (also salamis, tahinis, pepperonis)
+    "tomato"     matches "tomatoes"
+    "peach"      matches "peaches"
+    "quiche"     matches "quiches"          (also brioches, ganaches)
+
+Both directions are answered from hash lookups, not by testing
+ingredients one at a time:
+  - names containing every user token: intersect the token -> names
+    posting lists, smallest first
+  - names contained in the user's term: look up each subset of the
+    user's tokens in a token set -> names map
+So the work depends on the query and on how many names actually match,
+not on how many names merely share a common word like "oil".
+"""
+
+from collections import defaultdict
+from itertools import combinations
+from math import comb
+import re
+
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+# A user term with more subsets than this to look up (a long pasted
+# phrase) is matched by testing the names sharing its words instead
+MAX_SUBSETS = 256
+
+
+def stem(word):
+    """
+    Reduce a plural word to its singular stem.
+    Only needs to be consistent, since both sides use the same rule.
+
+    Different singulars can share a plural ending, so the singular
+    endings are folded too:
+      - -y (berry), -i (chili) and -ie (cookie) all pluralize to -ies,
+        so they become one -i stem: berries/berry -> berri,
+        chilies/chili -> chili, cookies/cookie -> cooki.
+      - -ches is the plural of both -ch (peach) and -che (quiche), and
+        -oes of both -o (tomato) and -oe (sloe), so a final e after
+        ch, sh or o is dropped: quiches/quiche -> quich.
+    Words ending in -ss or -us (watercress, asparagus) are singular
+    already and keep their s.
+    """
+    if len(word) > 3 and not word.endswith(('ss', 'us')):
+        if word.endswith('ies'):
+            word = word[:-2]              # berries -> berri
+        elif word.endswith(('oes', 'ches', 'shes', 'xes')):
+            word = word[:-2]              # tomatoes -> tomato, peaches -> peach
+        elif word.endswith('s'):
+            word = word[:-1]              # eggs -> egg, kiwis -> kiwi
+    if word.endswith('ie'):
+        return word[:-1]                  # cookie -> cooki
+    if word.endswith(('che', 'she', 'oe')):
+        return word[:-1]                  # quiche -> quich
+    if word.endswith('y'):
+        return word[:-1] + 'i'            # berry -> berri
+    return word
+
+
+def tokenize(text):
+    """Turn an ingredient name into a frozenset of stemmed, lowercase words."""
+    return frozenset(stem(word) for word in WORD_RE.findall(text.lower()))
+
+
+class IngredientMatcher:
+    """Token index over every distinct ingredient name in the catalogue."""
+
+    def __init__(self, names):
+        # lowercased ingredient name -> its token set
+        self.tokens = {}
+        # token -> names of ingredients containing it
+        self.by_token = defaultdict(set)
+        # token set -> names of ingredients with exactly those tokens
+        self.by_tokens = defaultdict(set)
+        # Most tokens in any one name: bigger subsets can't be a name
+        self.max_tokens = 0
+
+        for name in names:
+            name = name.lower()
+            if name in self.tokens:
+                continue
+            tokens = tokenize(name)
+            self.tokens[name] = tokens
+            for token in tokens:
+                self.by_token[token].add(name)
+            if tokens:
+                self.by_tokens[tokens].add(name)
+                self.max_tokens = max(self.max_tokens, len(tokens))
+
+    def match(self, user_ingredients):
+        """Return the set of (lowercased) ingredient names the user has."""
+        matched = set()
+        for term in user_ingredients:
+            user_tokens = tokenize(term)
+            if user_tokens:
+                matched |= self._containing(user_tokens)
+                matched |= self._contained_in(user_tokens)
+        return matched
+
+    def contained(self, user_ingredients):
+        """
+        Return the names the user has in full: every word of the name is
+        in one of the user's terms ("rice" for "brown rice", but not
+        "sparkling water" for "water").
+        """
+        found = set()
+        for term in user_ingredients:
+            user_tokens = tokenize(term)
+            if user_tokens:
+                found |= self._contained_in(user_tokens)
+        return found
+
+    def _containing(self, user_tokens):
+        """Names whose tokens include every user token ("chicken" -> "chicken breast")."""
+        postings = sorted((self.by_token.get(token, ()) for token in user_tokens), key=len)
+        if not postings[0]:
+            return set()
+        return set(postings[0]).intersection(*postings[1:])
+
+    def _contained_in(self, user_tokens):
+        """Names whose tokens are all in the user's term ("brown rice" -> "rice")."""
+        sizes = range(1, min(len(user_tokens), self.max_tokens) + 1)
+        if sum(comb(len(user_tokens), size) for size in sizes) > MAX_SUBSETS:
+            candidates = set().union(*(self.by_token.get(token, ()) for token in user_tokens))
+            return {name for name in candidates if self.tokens[name] <= user_tokens}
+
+        found = set()
+        for size in sizes:
+            for subset in combinations(user_tokens, size):
+                found |= self.by_tokens.get(frozenset(subset), set())
+        return found
@@ -0,0 +1,404 @@
+"""
+Recipe Ratings
+==============
+Writes user ratings to the database.
+
+Ratings are stored as a running total (`rating_sum`) and a vote count
+(`rating_count`). Adding a vote is a single atomic UPDATE, so two
+workers rating the same recipe at the same time can't overwrite each
+other, and the average (`rating`) is always exactly sum / count instead
+of drifting through repeated rounding.
+"""
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RatingBusy(Exception):
+    """Raised when the database stayed locked longer than the busy timeout."""
+
+
+def is_busy_error(error):
+    """Check whether an OperationalError means "database is locked/busy"."""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def add_rating(db, recipe_id, rating):
+    """
+    Add one vote to a recipe.
+
+    Returns (new_average, new_count), or None if the recipe doesn't exist.
+    The write lock is taken up front (BEGIN IMMEDIATE), so the statement
+    waits on the connection's busy_timeout instead of failing halfway.
+    """
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        row = db.execute('''
+            UPDATE recipes
+            SET rating_sum = rating_sum + :rating,
+                rating_count = rating_count + 1,
+                rating = (rating_sum + :rating) * 1.0 / (rating_count + 1)
+            WHERE id = :id
+            RETURNING rating, rating_count
+        ''', {'rating': rating, 'id': recipe_id}).fetchone()
+        db.commit()
+    except sqlite3.OperationalError as e:
+        db.rollback()
+        if is_busy_error(e):
+            raise RatingBusy(str(e)) from e
+        raise
+
+    if row is None:
+        return None
+    return row['rating'], row['rating_count']
+
+
+# ── Write-Behind Queue ─────────────────────────────────────
+# During rating spikes each /api/rate call paying for its own commit
+# (and fsync) becomes the bottleneck. In write-behind mode votes are
+# queued in memory and a background thread writes them in batches,
+# one transaction per batch.
+#
+# So a crash doesn't lose queued votes, every vote is also appended to
+# a spill file next to the database, and fsynced, before submit()
+# returns. The fsync is a group commit: votes are appended under the
+# lock, then one thread syncs the file outside it on behalf of every
+# submitter waiting at that moment, so concurrent votes share a sync
+# instead of queueing up for one each. With fsync=False the sync is
+# skipped: a crashed worker still loses nothing (the OS has the data),
+# but a power cut can, the same trade-off as WAL with synchronous=NORMAL
+# on the direct path. Each batch gets its own file ("segment"), which is deleted
+# once the batch is committed. Segments left behind by a dead worker
+# are replayed by the next queue to start.
+#
+# The batch's segment names are recorded in `applied_segments` in the
+# same transaction as its votes. If a worker dies between that commit
+# and deleting the files, recovery finds the names there and deletes
+# the files instead of counting their votes twice. The names are
+# dropped again by the next batch's transaction, once the files are gone.
+
+def apply_votes(db, votes, segments=(), forget=()):
+    """
+    Write a list of (recipe_id, rating) votes in one transaction, and
+    record the names of the spill `segments` they came from. Names in
+    `forget` (segments already deleted) are removed in the same go.
+    """
+    totals = {}
+    for recipe_id, rating in votes:
+        vote_sum, vote_count = totals.get(recipe_id, (0, 0))
+        totals[recipe_id] = (vote_sum + rating, vote_count + 1)
+
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        db.executemany('''
+            UPDATE recipes
+            SET rating_sum = rating_sum + :sum,
+                rating_count = rating_count + :count,
+                rating = (rating_sum + :sum) * 1.0 / (rating_count + :count)
+            WHERE id = :id
+        ''', [
+            {'id': recipe_id, 'sum': vote_sum, 'count': vote_count}
+            for recipe_id, (vote_sum, vote_count) in totals.items()
+        ])
+        db.executemany('DELETE FROM applied_segments WHERE name = ?', [(name,) for name in forget])
+        db.executemany(
+            'INSERT OR IGNORE INTO applied_segments (name) VALUES (?)',
+            [(name,) for name in segments]
+        )
+        db.commit()
+    except sqlite3.OperationalError as e:
+        db.rollback()
+        if is_busy_error(e):
+            raise RatingBusy(str(e)) from e
+        raise
+
+
+def read_segment(path):
+    """Read the votes stored in a spill file, skipping a torn last line."""
+    votes = []
+    with open(path) as f:
+        for line in f:
+            try:
+                vote = json.loads(line)
+            except ValueError:
+                continue  # half-written line from a crash
+            votes.append((vote['recipe_id'], vote['rating']))
+    return votes
+
+
+def pid_alive(pid):
+    """Check whether a process with this pid is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RatingQueue:
+    """
+    Batches rating writes on a background thread.
+
+    submit() records a vote and returns an optimistic average straight
+    away; the vote reaches the database within `flush_ms` milliseconds,
+    or sooner once `batch_size` votes are waiting. With `fsync` (the
+    default) submit() only returns once the vote's spill file is synced.
+    """
+
+    def __init__(self, pool, spill_prefix, flush_ms=200, batch_size=100, fsync=True):
+        self.pool = pool
+        self.spill_prefix = spill_prefix
+        self.flush_interval = flush_ms / 1000.0
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.flushed = 0
+        self.batches = 0
+        lock = threading.RLock()
+        self._cond = threading.Condition(lock)         # wakes the flush thread
+        self._synced_cond = threading.Condition(lock)  # wakes submitters waiting on a sync
+        self._reset()
+
+    def _reset(self):
+        """Start with an empty queue (at start-up and after a fork)."""
+        for fd in getattr(self, '_dirty', ()):
+            os.close(fd)  # inherited from the parent, which syncs its own files
+        self._pid = os.getpid()
+        self._thread = None
+        self._closed = False
+        self._votes = []          # votes in the open segment
+        self._segment = None      # open spill file for those votes
+        self._sealed = []         # [(path, votes, tracked)] waiting to be written
+        self._pending = {}        # recipe id -> [sum, count] not yet in the DB
+        self._deleted = []        # applied segments whose files are gone
+        self._seq = 0
+        # Group commit: votes are numbered as they're written, and
+        # submit() returns once a sync has covered its number
+        self._written = 0         # votes written to spill files
+        self._synced = 0          # votes known to be on disk
+        self._syncing = False     # a thread is running fsync right now
+        self._dirty = []          # duplicated fds of files written since the last sync
+        self._segment_dirty = False
+
+    # ── Producer side (request threads) ──
+    def submit(self, recipe, rating):
+        """
+        Queue one vote for a cached recipe dict.
+        Returns the optimistic (average, count) including queued votes.
+        """
+        recipe_id = recipe['id']
+        with self._cond:
+            self._ensure_started()
+
+            if self._segment is None:
+                self._seq += 1
+                path = f'{self.spill_prefix}.{self._pid}.{self._seq}.log'
+                self._segment = (path, open(path, 'a'))
+            spill = self._segment[1]
+            spill.write(json.dumps({'recipe_id': recipe_id, 'rating': rating}) + '\n')
+            spill.flush()
+            if self.fsync and not self._segment_dirty:
+                # A duplicate fd, so the segment can be sealed (closed)
+                # while a sync is still running
+                self._dirty.append(os.dup(spill.fileno()))
+                self._segment_dirty = True
+            self._written += 1
+            ticket = self._written
+            self._votes.append((recipe_id, rating))
+
+            pending = self._pending.setdefault(recipe_id, [0, 0])
+            pending[0] += rating
+            pending[1] += 1
+            if len(self._votes) >= self.batch_size:
+                self._cond.notify()
+
+            # The cached average is exactly sum / count, so the sum is recoverable
+            count = recipe['rating_count'] + pending[1]
+            total = round(recipe['rating'] * recipe['rating_count']) + pending[0]
+        if self.fsync:
+            self._sync(ticket)  # on disk before the vote is acknowledged
+        return total / count, count
+
+    def _sync(self, ticket):
+        """Wait until vote number `ticket` is on disk, syncing it if nobody else is."""
+        with self._cond:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._synced_cond.wait()
+                    continue
+                # Sync everything written so far, for every waiting submitter
+                self._syncing = True
+                target = self._written
+                fds, self._dirty = self._dirty, []
+                self._segment_dirty = False
+                synced = False
+                self._cond.release()
+                try:
+                    for fd in fds:
+                        os.fsync(fd)
+                    synced = True
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._synced_cond.notify_all()
+                    if not synced:
+                        self._dirty[:0] = fds  # the next sync retries them
+                for fd in fds:
+                    os.close(fd)
+                self._synced = target
+
+    # ── Consumer side (background thread) ──
+    def start(self):
+        """
+        Replay orphaned spill files and start the flush thread now,
+        rather than on the first vote (called at worker start-up).
+        """
+        with self._cond:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        """Recover orphaned spill files and start the flush thread."""
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name='rating-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._votes) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self._flush()
+            except Exception:
+                # Keep the thread alive; the votes stay queued for the next try
+                logger.exception('Failed to flush queued ratings')
+            if closed:
+                return
+
+    def _seal(self):
+        """Close the open segment and move its votes to the write list."""
+        if self._segment is not None:
+            path, f = self._segment
+            f.close()
+            self._sealed.append((path, self._votes, True))
+            self._segment = None
+            self._votes = []
+
+    def _flush(self):
+        """Write every queued vote to the database in one transaction."""
+        with self._cond:
+            self._seal()
+            sealed = list(self._sealed)
+        if not sealed:
+            return
+
+        votes = [vote for _, batch, _ in sealed for vote in batch]
+        segments = [os.path.basename(path) for path, _, _ in sealed]
+        db = self.pool.acquire()
+        try:
+            apply_votes(db, votes, segments, forget=self._deleted)
+        except RatingBusy:
+            return  # keep the batch; the next flush retries it
+        finally:
+            self.pool.release(db)
+
+        with self._cond:
+            del self._sealed[:len(sealed)]
+            # Votes are in the database now, so stop counting them as pending
+            # (recovered votes were never counted in the first place)
+            for _, batch, tracked in sealed:
+                for recipe_id, rating in (batch if tracked else ()):
+                    pending = self._pending[recipe_id]
+                    pending[0] -= rating
+                    pending[1] -= 1
+                    if not pending[1]:
+                        del self._pending[recipe_id]
+            self.flushed += len(votes)
+            self.batches += 1
+        for path, _, _ in sealed:
+            os.remove(path)
+        self._deleted = segments
+
+    def _recover(self):
+        """Replay spill files left behind by workers that have exited."""
+        directory = os.path.dirname(self.spill_prefix)
+        db = self.pool.acquire()
+        try:
+            applied = {name for name, in db.execute('SELECT name FROM applied_segments')}
+            # Drop rows whose files are already gone now, before this
+            # worker names any segment (a reused pid could repeat a name)
+            gone = [name for name in applied if not os.path.exists(os.path.join(directory, name))]
+            apply_votes(db, [], forget=gone)
+        except RatingBusy:
+            self._deleted = gone  # the first flush drops them instead
+        finally:
+            self.pool.release(db)
+
+        for path in glob.glob(f'{self.spill_prefix}.*.log'):
+            try:
+                pid = int(path[len(self.spill_prefix) + 1:].split('.')[0])
+            except ValueError:
+                # Not one of ours (e.g. an editor backup); leave it alone
+                logger.warning('Ignoring unexpected file next to the rating spill files: %s', path)
+                continue
+            if pid != os.getpid() and pid_alive(pid):
+                continue
+            if os.path.basename(path) in applied:
+                # Committed, but its worker died before deleting the file
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self._deleted.append(os.path.basename(path))
+                continue
+            # Claim the file first so two workers never replay it twice.
+            # The new name carries our pid and still matches the glob, so
+            # if we die before flushing it the next worker claims it again.
+            claimed = self._claim_path()
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            self._sealed.append((claimed, read_segment(claimed), False))
+
+    def _claim_path(self):
+        """Pick an unused spill file name for a recovered segment."""
+        while True:
+            self._seq += 1
+            path = f'{self.spill_prefix}.{self._pid}.r{self._seq}.log'
+            if not os.path.exists(path):
+                return path
+
+    def close(self):
+        """Flush everything that's queued and stop the background thread."""
+        with self._cond:
+            if self._pid != os.getpid() or self._thread is None:
+                return
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        thread.join()
+
+    def stats(self):
+        """Return the queue counters as a dict."""
+        with self._cond:
+            return {
+                'queued': len(self._votes) + sum(len(v) for _, v, _ in self._sealed),
+                'flushed': self.flushed,
+                'batches': self.batches,
+            }
@@ -0,0 +1,222 @@
+"""
+Recipe Recommendations
+======================
+Item-to-item recommendations for POST /api/recommendations.
+
+Two recipes are similar when they share ingredients (Jaccard overlap
+of their ingredient sets), come from the same cuisine and have the same
+dietary type:
+
+    similarity = 0.6 × jaccard + 0.25 × same cuisine + 0.15 × same dietary
+
+For every recipe we keep only its most similar recipes (the
+"neighbours"). Recommending is then a walk over the neighbours of the
+recipes a user rated: each neighbour collects the similarity weighted
+by how much the user liked the rated recipe, so 4-5 stars pull similar
+recipes up and 1-2 stars push them down.
+
+Comparing every pair of recipes would be quadratic, since staples like
+salt or garlic link almost every pair. Instead each recipe is only
+scored against a bounded set of candidates. These are recipes of the
+same cuisine and dietary type, then recipes sharing its rarer
+ingredients, then the rest of its cuisine. At most MAX_POSTING ids
+are read from any one posting list, and common ingredients are skipped
+once there are enough candidates. Only the CANDIDATES recipes sharing
+the most are scored exactly. The neighbours are therefore approximate,
+but a build costs about the same per recipe whatever the size of the
+catalogue (about 5 s for 20,000 recipes, against minutes for every
+pair).
+
+The table is updated incrementally: when the catalogue reloads, only
+recipes whose ingredients, cuisine or dietary type changed (and the
+recipes that listed them as neighbours) are recomputed.
+"""
+
+from collections import Counter, defaultdict
+import heapq
+from itertools import islice
+
+# Weights of the three similarity signals (they add up to 1)
+INGREDIENT_WEIGHT = 0.6
+CUISINE_WEIGHT = 0.25
+DIETARY_WEIGHT = 0.15
+
+# Similar recipes kept per recipe
+NEIGHBOURS = 20
+
+# Candidate generation bounds (see the module docstring): recipe ids
+# read from one posting list, and candidates scored per recipe
+MAX_POSTING = 50
+CANDIDATES = 2 * NEIGHBOURS
+
+# Ratings above this count as "liked", below as "disliked"
+NEUTRAL_RATING = 2.5
+
+
+def recipe_features(recipe):
+    """The parts of a recipe that similarity looks at."""
+    return (
+        frozenset(ing.lower() for ing in recipe['ingredients']),
+        (recipe['cuisine'] or '').lower(),
+        recipe['dietary']
+    )
+
+
+def similarity(a, b):
+    """Similarity of two recipe_features() tuples, from 0 to 1."""
+    ingredients_a, cuisine_a, dietary_a = a
+    ingredients_b, cuisine_b, dietary_b = b
+    shared = len(ingredients_a & ingredients_b)
+    union = len(ingredients_a) + len(ingredients_b) - shared
+    score = INGREDIENT_WEIGHT * (shared / union if union else 0.0)
+    if cuisine_a and cuisine_a == cuisine_b:
+        score += CUISINE_WEIGHT
+    if dietary_a == dietary_b:
+        score += DIETARY_WEIGHT
+    return score
+
+
+class SimilarityTable:
+    """Top-N most similar recipes for every recipe, kept up to date by update()."""
+
+    def __init__(self):
+        self.features = {}                        # recipe id -> recipe_features()
+        self.neighbours = {}                      # recipe id -> [(score, other id)], best first
+        # Posting lists are dicts used as ordered sets, so reading the
+        # first MAX_POSTING entries is deterministic
+        self.by_ingredient = defaultdict(dict)    # ingredient -> recipe ids
+        self.by_cuisine = defaultdict(dict)       # cuisine -> recipe ids
+        self.by_group = defaultdict(dict)         # (cuisine, dietary) -> recipe ids
+        self.listed_in = defaultdict(set)         # recipe id -> ids whose neighbours include it
+        self.recomputed = 0                       # rows recomputed by the last update()
+
+    def update(self, recipes):
+        """
+        Bring the table in line with `recipes` and return it.
+        The first call builds every row; later calls only touch recipes
+        that changed and the rows that depend on them.
+        """
+        current = {recipe['id']: recipe_features(recipe) for recipe in recipes}
+        changed = {
+            recipe_id for recipe_id in current.keys() | self.features.keys()
+            if current.get(recipe_id) != self.features.get(recipe_id)
+        }
+        self.recomputed = 0
+        if not changed:
+            return self
+
+        for recipe_id in changed:
+            old = self.features.pop(recipe_id, None)
+            if old is not None:
+                self._unlink(recipe_id, old)
+            if recipe_id in current:
+                self.features[recipe_id] = current[recipe_id]
+                self._link(recipe_id, current[recipe_id])
+
+        # Rows that listed a changed recipe may need a neighbour they had
+        # dropped, so those are recomputed in full, like the changed ones.
+        stale = set(changed)
+        for recipe_id in changed:
+            stale |= self.listed_in.get(recipe_id, set())
+        # Rows are replaced one at a time rather than cleared first, so a
+        # request reading the table meanwhile never sees a row missing
+        present = []
+        for recipe_id in stale:
+            if recipe_id in self.features:
+                present.append(recipe_id)
+            else:
+                self._set_row(recipe_id, None)  # removed recipe
+        for recipe_id in present:
+            scores = self._scores(recipe_id)
+            self._set_row(recipe_id, heapq.nlargest(
+                NEIGHBOURS, ((score, other) for other, score in scores.items()),
+                key=lambda pair: (pair[0], -pair[1])
+            ))
+            # Every other row can only gain this recipe, never lose anything
+            if recipe_id in changed:
+                for other, score in scores.items():
+                    if other not in stale:
+                        self._offer(other, score, recipe_id)
+        for recipe_id in changed - self.features.keys():
+            self.listed_in.pop(recipe_id, None)
+        self.recomputed = len(present)
+        return self
+
+    def recommend(self, ratings, k):
+        """
+        Return up to k (recipe_id, score) pairs for a user's
+        {recipe_id: rating} history, best first. Rated recipes and
+        recipes with no positive score are left out.
+        """
+        scores = defaultdict(float)
+        for recipe_id, rating in ratings.items():
+            weight = rating - NEUTRAL_RATING
+            for score, other in self.neighbours.get(recipe_id, ()):
+                scores[other] += weight * score
+        candidates = (
+            (recipe_id, score) for recipe_id, score in scores.items()
+            if score > 0 and recipe_id not in ratings
+        )
+        best = heapq.nlargest(k, candidates, key=lambda pair: (pair[1], -pair[0]))
+        return [(recipe_id, round(score, 3)) for recipe_id, score in best]
+
+    def _link(self, recipe_id, features):
+        ingredients, cuisine, dietary = features
+        for ingredient in ingredients:
+            self.by_ingredient[ingredient][recipe_id] = None
+        if cuisine:
+            self.by_cuisine[cuisine][recipe_id] = None
+            self.by_group[cuisine, dietary][recipe_id] = None
+
+    def _unlink(self, recipe_id, features):
+        ingredients, cuisine, dietary = features
+        for ingredient in ingredients:
+            self.by_ingredient[ingredient].pop(recipe_id, None)
+        if cuisine:
+            self.by_cuisine[cuisine].pop(recipe_id, None)
+            self.by_group[cuisine, dietary].pop(recipe_id, None)
+
+    def _scores(self, recipe_id):
+        """Similarity to the candidate recipes (see the module docstring)."""
+        features = self.features[recipe_id]
+        ingredients, cuisine, dietary = features
+        shared = Counter()
+        # Recipes of the same cuisine and dietary type start 0.4 ahead,
+        # so some of them are always candidates
+        if cuisine:
+            shared.update(islice(self.by_group[cuisine, dietary], MAX_POSTING))
+        # Then the rarest ingredients first, and the rest of the cuisine last
+        postings = sorted((self.by_ingredient[ingredient] for ingredient in ingredients), key=len)
+        if cuisine:
+            postings.append(self.by_cuisine[cuisine])
+        for posting in postings:
+            if len(posting) > MAX_POSTING and len(shared) > CANDIDATES:
+                continue  # a common ingredient, and there are enough candidates already
+            shared.update(islice(posting, MAX_POSTING))
+        shared.pop(recipe_id, None)
+
+        # Most shared ingredients first (ties in the order they were read)
+        return {
+            other: similarity(features, self.features[other])
+            for other, _ in shared.most_common(CANDIDATES)
+        }
+
+    def _set_row(self, recipe_id, row):
+        """Replace a recipe's neighbour list (None removes it)."""
+        old = self.neighbours.get(recipe_id, ())
+        if row is None:
+            self.neighbours.pop(recipe_id, None)
+        else:
+            self.neighbours[recipe_id] = row
+        for _, other in old:
+            self.listed_in[other].discard(recipe_id)
+        for _, other in row or ():
+            self.listed_in[other].add(recipe_id)
+
+    def _offer(self, recipe_id, score, other):
+        """Add `other` to a recipe's neighbours if it scores high enough."""
+        row = self.neighbours.get(recipe_id, [])
+        if len(row) >= NEIGHBOURS and (score, -other) <= (row[-1][0], -row[-1][1]):
+            return
+        row = sorted(row + [(score, other)], key=lambda pair: (-pair[0], pair[1]))
+        self._set_row(recipe_id, row[:NEIGHBOURS])
@@ -0,0 +1,185 @@
+"""
+Search Scoring and Batch Jobs
+=============================
+Runs the configured search backend for one query, and for many.
+
+score_recipes() is what /api/search calls for a single query.
+POST /api/search/batch calls it once per query on the same catalogue,
+or, for big batches, hands chunks of queries to a pool of worker
+processes. The pool is started once per web worker and reused. Each
+process opens the database itself and builds its own catalogue and
+index once (refreshing them when the recipes change), so only the
+small query tuples and scored (id, score, matched, total) tuples
+travel between processes.
+
+Nothing here imports app.py, so worker processes start without loading
+the web app.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import logging
+import multiprocessing
+import os
+import threading
+
+from catalog import Catalog
+from db_pool import ConnectionPool
+from search_sql import count_filtered, sql_search
+
+logger = logging.getLogger(__name__)
+
+
+def score_recipes(db, catalog, backend, user_ingredients, filters, k, credit=0.0):
+    """
+    Run one search with the given backend ("index", "sql" or "vector").
+    `filters` is a SearchFilters tuple (search_index.py); ingredients the
+    user can substitute count as `credit` of a match (0 turns that off).
+
+    Returns (matched, covered, top_scored, total_filtered, total_scored),
+    where `matched` is the set of ingredient names the user has,
+    `covered` maps recipe ids to {ingredient: the user's substitute} and
+    `top_scored` holds (recipe_id, score, matched_count, total) tuples.
+    """
+    # Resolve the user's terms to known ingredient names once, using
+    # token matching ("egg" matches "eggs" but not "eggplant").
+    matched = catalog.matcher().match(user_ingredients)
+    covered = catalog.substitutions().covered(user_ingredients, matched) if credit else {}
+
+    if backend == 'sql':
+        top_scored, total_filtered, total_scored = sql_search(
+            db, matched, filters, limit=k, substituted=covered, credit=credit
+        )
+    else:
+        index = catalog.vector_index() if backend == 'vector' else catalog.index()
+        top_scored, total_scored = index.search(
+            matched, filters, k=k, substituted=covered, credit=credit
+        )
+        # The index filters candidates in memory; the overall count
+        # comes straight from the filter index in SQLite.
+        total_filtered = count_filtered(db, filters)
+
+    return matched, covered, top_scored, total_filtered, total_scored
+
+
+# ── Worker Processes ───────────────────────────────────────
+# Set once per worker process by _init_worker().
+_worker = None
+
+# The process pool of this web worker, created on the first big batch
+# and reused after that: starting processes, importing the app modules
+# and building the catalogue costs more than most batches take to
+# score. `_executor_key` holds the settings it was started with.
+_executor = None
+_executor_key = None
+_executor_lock = threading.Lock()
+
+
+class SearchFailed(Exception):
+    """Yielded by score_in_processes() for each query of a chunk that failed."""
+
+
+def _init_worker(db_path, backend, credit):
+    """Open the database and load the catalogue in a new worker process."""
+    global _worker
+    pool = ConnectionPool(db_path, max_size=1)
+    catalog = Catalog()
+    _worker = [pool, catalog, backend, credit, pool.generation]
+
+
+def _score_chunk(queries):
+    """
+    Score a list of (user_ingredients, filters, k) queries. Invalid queries are passed as None and give None back.
+    """
+    pool, catalog, backend, credit, generation = _worker
+    db = pool.acquire()
+    try:
+        if pool.generation != generation:
+            # The database file was replaced; its versions may repeat old ones
+            _worker[4] = pool.generation
+            catalog.forget()
+        catalog.refresh(db)
+        return [
+            score_recipes(db, catalog, backend, *query, credit=credit) if query is not None else None
+            for query in queries
+        ]
+    finally:
+        pool.release(db)
+
+
+def get_executor(db_path, backend, workers, credit):
+    """Return this process's search pool, starting it (or restarting it with new settings) if needed."""
+    global _executor, _executor_key
+    key = (os.getpid(), db_path, backend, workers, credit)
+    with _executor_lock:
+        if _executor is not None and _executor_key != key:
+            if _executor_key[0] == os.getpid():
+                _executor.shutdown(wait=False)
+            _executor = None  # otherwise inherited through a fork: not ours
+        if _executor is None:
+            # "spawn" starts clean interpreters: forking a threaded web worker
+            # (with open SQLite connections) isn't safe.
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(db_path, backend, credit)
+            )
+            _executor_key = key
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the search pool's processes (called when the web worker exits)."""
+    global _executor, _executor_key
+    with _executor_lock:
+        if _executor is not None and _executor_key[0] == os.getpid():
+            _executor.shutdown()
+        _executor = None
+        _executor_key = None
+
+
+def _discard_executor(executor):
+    """Forget a pool that broke (a process died), so the next batch starts a new one."""
+    global _executor, _executor_key
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+            _executor_key = None
+    executor.shutdown(wait=False)
+
+
+def score_in_processes(db_path, backend, queries, workers, credit=0.0, chunk_size=100):
+    """
+    Score an iterable of queries across `workers` processes.
+
+    Yields one result per query, in the same order. Only a few chunks
+    per worker are in flight at a time, so a long batch doesn't pile
+    up in memory while results are being sent. If a chunk fails, each
+    of its valid queries yields a SearchFailed instead of a result.
+    """
+    executor = get_executor(db_path, backend, workers, credit)
+    queries = iter(queries)
+    in_flight = []  # (future, chunk)
+    while True:
+        while len(in_flight) < workers * 2:
+            chunk = list(islice(queries, chunk_size))
+            if not chunk:
+                break
+            try:
+                future = executor.submit(_score_chunk, chunk)
+            except BrokenProcessPool as e:
+                future = Future()
+                future.set_exception(e)
+            in_flight.append((future, chunk))
+        if not in_flight:
+            return
+        future, chunk = in_flight.pop(0)
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.exception('Batch search chunk failed')
+            if isinstance(e, BrokenProcessPool):
+                _discard_executor(executor)
+            failed = SearchFailed('Search failed')
+            results = [None if query is None else failed for query in chunk]
+        yield from results
@@ -0,0 +1,141 @@
+"""
+Ingredient Search Index
+=======================
+An in-memory inverted index used by the /api/search endpoint.
+
+Instead of scoring every recipe on every request, we build the index
+once from the recipe catalogue (see catalog.py) and keep it in the
+worker process:
+
+    ingredient -> posting list of recipe ids
+
+A search then only touches the recipes that share at least one
+ingredient with the user's list. Which ingredients the user has is
+decided by the token matcher (see matcher.py). Each recipe's total
+ingredient count is stored up front, so scoring is just a counter
+increment.
+"""
+
+from collections import defaultdict, namedtuple
+import heapq
+
+from database import DIFFICULTY_RANK
+
+
+# The filters of one search. max_rank is the highest difficulty rank
+# allowed (None = any); max_calories and min_protein are per serving
+# (None = no limit).
+SearchFilters = namedtuple(
+    'SearchFilters', 'dietary max_rank max_time max_calories min_protein',
+    defaults=('', None, 999, None, None)
+)
+
+
+def max_difficulty_rank(max_difficulty):
+    """Turn the "max difficulty" filter into a rank (None means no filter)."""
+    return DIFFICULTY_RANK.get(max_difficulty, 3) if max_difficulty else None
+
+
+def find_missing_ingredients(recipe_ingredients, matched):
+    """
+    List the (lowercased) recipe ingredients the user doesn't have.
+    `matched` is the set of ingredient names returned by the matcher.
+    """
+    return [ing for ing in (i.lower() for i in recipe_ingredients) if ing not in matched]
+
+
+class IngredientIndex:
+    """
+    Inverted index over recipe ingredients.
+
+    The index only stores what searching needs: the filter columns,
+    the lowercased ingredient list of each recipe and the posting lists.
+    Full recipes are looked up afterwards, and only for the winners.
+    """
+
+    def __init__(self, recipes, per_serving=None):
+        """`per_serving` maps recipe id -> per-serving nutrition (Catalog.per_serving)."""
+        per_serving = per_serving or {}
+        # recipe id -> (dietary, difficulty rank, cook_time, calories, protein)
+        self.filters = {}
+        # recipe id -> lowercased ingredient list (in recipe order)
+        self.ingredients = {}
+        # ingredient -> list of recipe ids (one entry per occurrence)
+        self.postings = defaultdict(list)
+        # Recipe ids in table order, so ties keep the original ordering
+        self.order = []
+
+        for recipe in recipes:
+            recipe_id = recipe['id']
+            ingredients = [ing.lower() for ing in recipe['ingredients']]
+
+            self.order.append(recipe_id)
+            self.ingredients[recipe_id] = ingredients
+            nutrition = per_serving.get(recipe_id, {})
+            self.filters[recipe_id] = (
+                recipe['dietary'],
+                DIFFICULTY_RANK.get(recipe['difficulty'], 2),
+                recipe['cook_time'],
+                nutrition.get('calories'),
+                nutrition.get('protein'),
+            )
+            for ing in ingredients:
+                self.postings[ing].append(recipe_id)
+
+        # Position of every recipe in table order (used for tie-breaking)
+        self.position = {recipe_id: i for i, recipe_id in enumerate(self.order)}
+
+    def __len__(self):
+        return len(self.order)
+
+    def passes_filters(self, recipe_id, filters):
+        """Check a recipe against the dietary, difficulty, time and nutrition filters."""
+        r_dietary, r_rank, r_time, r_calories, r_protein = self.filters[recipe_id]
+        if filters.dietary and r_dietary != filters.dietary:
+            return False
+        if filters.max_rank is not None and r_rank > filters.max_rank:
+            return False
+        # A recipe without nutrition data never passes a nutrition filter
+        if filters.max_calories is not None and (r_calories is None or r_calories > filters.max_calories):
+            return False
+        if filters.min_protein is not None and (r_protein is None or r_protein < filters.min_protein):
+            return False
+        return r_time <= filters.max_time
+
+    def search(self, matched, filters=SearchFilters(), k=None, substituted=None, credit=0.0):
+        """
+        Score candidate recipes against the user's ingredients.
+        `matched` is the set of ingredient names the user has (matcher.py)
+        and `filters` a SearchFilters tuple. `substituted` maps recipe ids
+        to the ingredients the user can substitute in them (see
+        substitutions.py); each counts as `credit` of a match.
+
+        Returns (top, total_scored): the best `k` (all if None) scored
+        recipes as (recipe_id, match_score, matched_count, total) tuples,
+        highest score first, and how many recipes were scored. Recipes
+        with the same score keep table order.
+        """
+        # Walk the posting lists of matched ingredients and count hits
+        counts = defaultdict(int)
+        for ing in matched:
+            for recipe_id in self.postings.get(ing, ()):
+                counts[recipe_id] += 1
+        substitutes = {recipe_id: len(subs) for recipe_id, subs in (substituted or {}).items()}
+
+        scored = []
+        for recipe_id in counts.keys() | substitutes.keys():
+            if not self.passes_filters(recipe_id, filters):
+                continue
+            matched = counts.get(recipe_id, 0)
+            total = len(self.ingredients[recipe_id])
+            score = round(((matched + credit * substitutes.get(recipe_id, 0)) / total) * 100, 1)
+            scored.append((recipe_id, score, matched, total))
+
+        # Highest score first, table order for ties
+        def rank(s):
+            return -s[1], self.position[s[0]]
+
+        if k is None:
+            return sorted(scored, key=rank), len(scored)
+        # A bounded heap keeps only k entries, so we never sort everything
+        return heapq.nsmallest(k, scored, key=rank), len(scored)
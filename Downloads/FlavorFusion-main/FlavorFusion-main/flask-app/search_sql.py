@@ -0,0 +1,97 @@
+"""
+SQL Search Backend
+==================
+Scores recipes inside SQLite using the normalized
+`ingredients` / `recipe_ingredients` tables (see database.py).
+
+One GROUP BY query counts matched ingredients per recipe, applies
+the filters, ranks the results and returns only the top N rows, so
+the rest of the catalogue never leaves the database.
+"""
+
+import json
+
+
+def build_filters(filters):
+    """
+    Build the WHERE fragment and parameters for a SearchFilters tuple.
+    The first three columns match the idx_recipes_filters composite
+    index; the nutrition columns have their own indexes.
+    """
+    clauses = []
+    params = []
+    if filters.dietary:
+        clauses.append('r.dietary = ?')
+        params.append(filters.dietary)
+    if filters.max_rank is not None:
+        clauses.append('r.difficulty_rank <= ?')
+        params.append(filters.max_rank)
+    clauses.append('r.cook_time <= ?')
+    params.append(filters.max_time)
+    if filters.max_calories is not None:
+        clauses.append('r.calories <= ?')
+        params.append(filters.max_calories)
+    if filters.min_protein is not None:
+        clauses.append('r.protein >= ?')
+        params.append(filters.min_protein)
+    return ' AND '.join(clauses), params
+
+
+def count_filtered(db, filters):
+    """Count the recipes that pass the filters, without fetching any rows."""
+    where, params = build_filters(filters)
+    return db.execute(f'SELECT COUNT(*) FROM recipes r WHERE {where}', params).fetchone()[0]
+
+
+def sql_search(db, matched, filters, limit=5, substituted=None, credit=0.0):
+    """
+    Score recipes with a single GROUP BY query.
+    `matched` is the set of ingredient names the user has (matcher.py)
+    and `filters` a SearchFilters tuple. `substituted` maps recipe ids
+    to the ingredients the user can substitute in them (see
+    substitutions.py); each counts as `credit` of a match.
+
+    Returns a tuple (top, total_filtered, total_scored) where `top` is a
+    list of (recipe_id, match_score, matched_count, total) tuples for the
+    best `limit` recipes, highest score first.
+    """
+    where, filter_params = build_filters(filters)
+
+    # `hits` has one row per matched ingredient of a recipe (hit = 1,
+    # sub = 0) and one per recipe the user can substitute in (hit = 0,
+    # sub = how many ingredients)
+    rows = db.execute(f'''
+        WITH hits(recipe_id, hit, sub) AS (
+            SELECT ri.recipe_id, 1, 0
+            FROM recipe_ingredients ri
+            JOIN ingredients i ON i.id = ri.ingredient_id
+            WHERE i.name IN (SELECT value FROM json_each(?))
+            UNION ALL
+            SELECT CAST(key AS INTEGER), 0, value FROM json_each(?)
+        )
+        SELECT h.recipe_id,
+               SUM(h.hit) AS matched,
+               SUM(h.sub) AS substituted,
+               r.ingredient_count AS total,
+               COUNT(*) OVER () AS total_scored
+        FROM hits h
+        JOIN recipes r ON r.id = h.recipe_id
+        WHERE {where}
+        GROUP BY h.recipe_id
+        ORDER BY round(100.0 * (SUM(h.hit) + ? * SUM(h.sub)) / r.ingredient_count, 1) DESC,
+                 h.recipe_id
+        LIMIT ?
+    ''', [json.dumps(sorted(matched)),
+          json.dumps({recipe_id: len(subs) for recipe_id, subs in (substituted or {}).items()})]
+        + filter_params + [credit, limit]).fetchall()
+
+    total_filtered = count_filtered(db, filters)
+
+    top = [
+        (row['recipe_id'],
+         round(((row['matched'] + credit * row['substituted']) / row['total']) * 100, 1),
+         row['matched'], row['total'])
+        for row in rows
+    ]
+    total_scored = rows[0]['total_scored'] if rows else 0
+    return top, total_filtered, total_scored
@@ -0,0 +1,77 @@
+"""
+Full-Text Search
+================
+Searches recipe names, descriptions and instructions with the SQLite
+FTS5 index `recipes_fts` (see database.py) for GET /api/recipes/search.
+
+Results are ranked by BM25, SQLite's built-in relevance score, with a
+word in the name counting more than one in the description, and more
+than one in the instructions. Each result carries a short snippet of
+the matching text with the hits wrapped in <mark> tags.
+"""
+
+from html import escape
+import re
+
+# BM25 weight of each indexed column: name, description, instructions
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Snippet markers that can't appear in recipe text. They are swapped
+# for <mark> tags after the text is HTML-escaped.
+MARK_START, MARK_END = '\x02', '\x03'
+SNIPPET_WORDS = 16
+
+WORD_RE = re.compile(r'\w+')
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 query that finds recipes containing
+    every word. Words are quoted, so characters like * or - in the
+    input are never read as FTS5 syntax. The last word also matches as
+    a prefix, since people often search while still typing it.
+    Returns None when the text has no words.
+    """
+    words = WORD_RE.findall(text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def text_search(db, text, limit=20, offset=0):
+    """
+    Return ([(recipe_id, snippet, rank), ...], total) for one page of
+    the recipes matching `text`, best first. Lower rank is better.
+    """
+    query = build_match_query(text)
+    if query is None:
+        return [], 0
+
+    total = db.execute(
+        'SELECT COUNT(*) FROM recipes_fts WHERE recipes_fts MATCH ?', (query,)
+    ).fetchone()[0]
+    if offset >= total:
+        return [], total
+
+    # snippet() column -1 picks whichever column matched best
+    rows = db.execute(f'''
+        SELECT rowid,
+               snippet(recipes_fts, -1, ?, ?, '…', {SNIPPET_WORDS}),
+               bm25(recipes_fts, {', '.join(map(str, COLUMN_WEIGHTS))}) AS rank
+        FROM recipes_fts
+        WHERE recipes_fts MATCH ?
+        ORDER BY rank, rowid
+        LIMIT ? OFFSET ?
+    ''', (MARK_START, MARK_END, query, limit, offset)).fetchall()
+
+    return [
+        (recipe_id, highlight(snippet), round(rank, 4))
+        for recipe_id, snippet, rank in rows
+    ], total
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and turn the match markers into <mark> tags."""
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
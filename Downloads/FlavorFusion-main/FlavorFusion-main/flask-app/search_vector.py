@@ -0,0 +1,177 @@
+"""
+Vectorized Search Backend
+=========================
+Scores every recipe at once with NumPy instead of a Python loop.
+
+The catalogue is stored as a sparse recipe x ingredient incidence
+matrix (one row per recipe, one column per distinct ingredient name)
+plus a vector with each recipe's ingredient total:
+
+                 onion  rice  tofu  ...
+    recipe 1   [   1     0     0   ...]      totals = [10, 8, ...]
+    recipe 2   [   0     1     1   ...]
+
+A query becomes a 0/1 vector over the ingredient columns, so
+`matrix @ query` gives the matched count of every recipe in one
+sparse matrix-vector product. The dietary/difficulty/time filters are
+boolean vectors combined with `&`.
+
+NumPy is optional. SciPy is used for the sparse product when it is
+installed; otherwise the same counts come from np.bincount over the
+matrix's column slices. Without NumPy, app.py falls back to the
+pure-Python index (search_index.py).
+"""
+
+from database import DIFFICULTY_RANK
+from search_index import SearchFilters
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+HAVE_NUMPY = np is not None
+
+
+class VectorIndex:
+    """
+    Incidence matrix over the recipe catalogue.
+
+    search() takes and returns the same things as
+    IngredientIndex.search(), so the two backends are interchangeable.
+    """
+
+    def __init__(self, recipes, per_serving=None):
+        """`per_serving` maps recipe id -> per-serving nutrition (Catalog.per_serving)."""
+        if np is None:
+            raise RuntimeError('the vector search backend needs numpy')
+
+        # ingredient name -> column number
+        self.columns = {}
+        rows, cols = [], []
+        totals, dietary, ranks, times, ids = [], [], [], [], []
+        calories, protein = [], []
+        per_serving = per_serving or {}
+
+        for row, recipe in enumerate(recipes):
+            ingredients = [ing.lower() for ing in recipe['ingredients']]
+            for ing in ingredients:
+                rows.append(row)
+                cols.append(self.columns.setdefault(ing, len(self.columns)))
+            totals.append(len(ingredients))
+            dietary.append(recipe['dietary'])
+            ranks.append(DIFFICULTY_RANK.get(recipe['difficulty'], 2))
+            times.append(recipe['cook_time'])
+            ids.append(recipe['id'])
+            nutrition = per_serving.get(recipe['id'], {})
+            calories.append(nutrition.get('calories'))
+            protein.append(nutrition.get('protein'))
+
+        # Rows are in table order, so the row number doubles as the tie-breaker
+        self.ids = np.array(ids, dtype=np.int64)
+        # recipe id -> row number
+        self.rows = {recipe_id: row for row, recipe_id in enumerate(ids)}
+        self.totals = np.array(totals, dtype=np.int64)
+        self.dietary = np.array(dietary, dtype=object)
+        self.ranks = np.array(ranks, dtype=np.int64)
+        self.times = np.array(times, dtype=np.int64)
+        # Missing values become NaN, which fails every comparison
+        self.calories = np.array(calories, dtype=np.float64)
+        self.protein = np.array(protein, dtype=np.float64)
+
+        # CSC layout (columns sorted): column j's rows are
+        # rows_by_col[col_start[j]:col_start[j + 1]]. A repeated ingredient
+        # appears twice, exactly like the posting lists of the Python index.
+        rows = np.array(rows, dtype=np.int64)
+        cols = np.array(cols, dtype=np.int64)
+        order = np.argsort(cols, kind='stable')
+        self.rows_by_col = rows[order]
+        self.col_start = np.searchsorted(cols[order], np.arange(len(self.columns) + 1))
+
+        self.matrix = None
+        if sparse is not None:
+            # Duplicate (row, col) entries are summed, giving a count of 2
+            self.matrix = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                shape=(len(ids), len(self.columns)),
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def matched_counts(self, matched):
+        """Return the number of matched ingredients for every recipe."""
+        query = [self.columns[ing] for ing in matched if ing in self.columns]
+        if not query:
+            return np.zeros(len(self.ids), dtype=np.int64)
+
+        if self.matrix is not None:
+            vector = np.zeros(len(self.columns), dtype=np.int64)
+            vector[query] = 1
+            return self.matrix @ vector
+
+        hits = np.concatenate([
+            self.rows_by_col[self.col_start[col]:self.col_start[col + 1]] for col in query
+        ])
+        return np.bincount(hits, minlength=len(self.ids))
+
+    def filter_mask(self, filters):
+        """Boolean vector of the recipes that pass every filter."""
+        mask = self.times <= filters.max_time
+        if filters.dietary:
+            mask &= self.dietary == filters.dietary
+        if filters.max_rank is not None:
+            mask &= self.ranks <= filters.max_rank
+        if filters.max_calories is not None:
+            mask &= self.calories <= filters.max_calories
+        if filters.min_protein is not None:
+            mask &= self.protein >= filters.min_protein
+        return mask
+
+    def search(self, matched, filters=SearchFilters(), k=None, substituted=None, credit=0.0):
+        """
+        Score all recipes against the user's ingredients.
+        `matched` is the set of ingredient names the user has (matcher.py)
+        and `filters` a SearchFilters tuple. `substituted` maps recipe ids
+        to the ingredients the user can substitute in them (see
+        substitutions.py); each counts as `credit` of a match.
+
+        Returns (top, total_scored), like IngredientIndex.search(): the
+        best `k` (all if None) recipes as (recipe_id, match_score,
+        matched_count, total) tuples, highest score first, and how many
+        recipes were scored. Recipes with the same score keep table order.
+        """
+        counts = self.matched_counts(matched)
+        substitutes = np.zeros(len(self.ids), dtype=np.int64)
+        for recipe_id, subs in (substituted or {}).items():
+            row = self.rows.get(recipe_id)
+            if row is not None:
+                substitutes[row] = len(subs)
+        rows = np.flatnonzero(((counts > 0) | (substitutes > 0)) & self.filter_mask(filters))
+        total_scored = len(rows)
+
+        credited = counts[rows] + credit * substitutes[rows]
+        scores = np.round(credited / self.totals[rows] * 100, 1)
+        # One integer per recipe that orders by score (descending), then
+        # row; scores have one decimal, so score * 10 is a whole number
+        keys = -np.rint(scores * 10).astype(np.int64) * len(self.ids) + rows
+        if k is not None and k < total_scored:
+            # argpartition finds the k smallest keys without a full sort
+            keep = np.argpartition(keys, k - 1)[:k]
+            rows, scores, keys = rows[keep], scores[keep], keys[keep]
+        order = np.argsort(keys)
+        rows, scores = rows[order], scores[order]
+
+        # Plain Python numbers, so the results serialize like the other backends
+        top = list(zip(
+            self.ids[rows].tolist(),
+            scores.tolist(),
+            counts[rows].tolist(),
+            self.totals[rows].tolist(),
+        ))
+        return top, total_scored
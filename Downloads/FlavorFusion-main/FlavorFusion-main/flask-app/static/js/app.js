@@ -14,6 +14,19 @@ let favorites = JSON.parse(localStorage.getItem('recipeFavorites')) || [];
 // We use localStorage to persist saved recipes across sessions.
 let savedRecipes = JSON.parse(localStorage.getItem('savedRecipes')) || [];
 
+// ── Browse Grid Fields ────────────────────────────────────
+// The browse grid only shows these fields, so we ask the API for
+// just them instead of downloading full recipes (instructions etc.).
+const BROWSE_FIELDS = 'name,description,cuisine,cook_time,difficulty,dietary,rating,rating_count';
+
+// ── Favorites ─────────────────────────────────────────────
+// Most ids the API takes in one ?ids= request (MAX_BATCH_IDS in app.py)
+const FAVORITES_BATCH_SIZE = 500;
+
+// ── Recommendations ───────────────────────────────────────
+// Most recent ratings sent to /api/recommendations
+const RATING_HISTORY_SENT = 200;
+
 // ── Initialize on Page Load ───────────────────────────────
 document.addEventListener('DOMContentLoaded', function() {
     // Load favorites and saved recipes from localStorage
@@ -39,12 +52,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const quickSearchResults = document.getElementById('quick-search-results');
     
     quickSearchInput.addEventListener('input', function() {
-        const query = this.value.trim();
-        if (query.length > 0) {
-            performQuickSearch(query);
-        } else {
-            hideQuickSearchResults();
-        }
+        performQuickSearch(this.value.trim());
     });
     
     quickSearchInput.addEventListener('keypress', function(e) {
@@ -53,6 +61,10 @@ document.addEventListener('DOMContentLoaded', function() {
             const selected = document.querySelector('.quick-search-item.selected');
             if (selected) {
                 selected.click();
+            } else if (this.value.trim()) {
+                // No suggestion picked: full-text search of every recipe
+                hideQuickSearchResults();
+                searchRecipesByText(this.value.trim());
             }
         }
     });
@@ -352,6 +364,15 @@ function buildRecipeCard(recipe, showScore) {
         if (recipe.missing_ingredients && recipe.missing_ingredients.length > 0) {
             card += '<p class="missing-list"><strong>Missing:</strong> ' + recipe.missing_ingredients.join(', ') + '</p>';
         }
+
+        // Missing ingredients the user can replace with something they have
+        var swaps = [];
+        for (var ing in (recipe.substituted_ingredients || {})) {
+            swaps.push(ing + ' → ' + recipe.substituted_ingredients[ing]);
+        }
+        if (swaps.length > 0) {
+            card += '<p class="missing-list"><strong>Swap in:</strong> ' + swaps.join(', ') + '</p>';
+        }
     }
 
     // Action buttons (stop click propagation so card click doesn't fire)
@@ -382,11 +403,12 @@ function openRecipeDetail(recipeId, event) {
     if (event && event.target.closest('.recipe-actions')) return;
 
     // Fetch full recipe data
-    fetch('/api/recipes')
-    .then(function(res) { return res.json(); })
-    .then(function(recipes) {
-        var recipe = recipes.find(function(r) { return r.id === recipeId; });
-        if (!recipe) return;
+    fetch('/api/recipes/' + recipeId)
+    .then(function(res) {
+        if (!res.ok) throw new Error('Recipe not found');
+        return res.json();
+    })
+    .then(function(recipe) {
 
         var modal = document.getElementById('recipe-modal');
         var body = document.getElementById('modal-body');
@@ -463,10 +485,9 @@ function openRecipeDetail(recipeId, event) {
 
 // ── Show Recipe Details ───────────────────────────────────
 function showRecipeDetails(recipeId) {
-    fetch('/api/recipes')
-    .then(function(res) { return res.json(); })
-    .then(function(recipes) {
-        const recipe = recipes.find(r => r.id == recipeId);
+    fetch('/api/recipes/' + recipeId)
+    .then(function(res) { return res.ok ? res.json() : null; })
+    .then(function(recipe) {
         if (!recipe) {
             showError('Recipe not found.');
             return;
@@ -626,7 +647,7 @@ function browseRecipes() {
     document.getElementById('browse-container').innerHTML = '';
     document.getElementById('browse-initial').style.display = 'none';
     
-    fetch('/api/recipes')
+    fetch('/api/recipes?fields=' + BROWSE_FIELDS)
     .then(function(response) {
         console.log('Response status:', response.status);
         if (!response.ok) {
@@ -683,7 +704,8 @@ function browseRecipes() {
 }
 
 // ── Load and Display Favorites ────────────────────────────
-// Fetches all recipes and filters to only show favorited ones.
+// Fetches only the favorited recipes (by id) from the API, in batches
+// of at most FAVORITES_BATCH_SIZE ids per request.
 function loadFavorites() {
     var container = document.getElementById('favorites-container');
 
@@ -692,12 +714,19 @@ function loadFavorites() {
         return;
     }
 
-    fetch('/api/recipes')
-    .then(function(res) { return res.json(); })
-    .then(function(recipes) {
-        var favoriteRecipes = recipes.filter(function(r) {
-            return favorites.indexOf(r.id) !== -1;
-        });
+    var requests = [];
+    for (var i = 0; i < favorites.length; i += FAVORITES_BATCH_SIZE) {
+        var ids = favorites.slice(i, i + FAVORITES_BATCH_SIZE);
+        requests.push(fetch('/api/recipes?fields=name,cuisine&ids=' + ids.join(','))
+            .then(function(res) {
+                if (!res.ok) throw new Error('HTTP ' + res.status);
+                return res.json();
+            }));
+    }
+
+    Promise.all(requests)
+    .then(function(batches) {
+        var favoriteRecipes = [].concat.apply([], batches);
 
         if (favoriteRecipes.length === 0) {
             container.innerHTML = '<p class="empty-state col-span-full text-center text-[#648273]">No favorites found.</p>';
@@ -765,7 +794,8 @@ function showAllFavorites() {
 }
 
 // ── Load Recommended Recipes ───────────────────────────────
-// Loads and displays top-rated recipes in descending order
+// Asks the server for recommendations based on the ratings stored in
+// localStorage. With no ratings yet it returns the top-rated recipes.
 function loadRecommendedRecipes() {
     const container = document.getElementById('recommended-container');
     const loading = document.getElementById('recommended-loading');
@@ -782,20 +812,19 @@ function loadRecommendedRecipes() {
     loading.style.display = 'block';
     container.innerHTML = '';
     
-    fetch('/api/recipes')
+    // The server keeps each recipe's latest rating and caps the history length
+    const ratingHistory = JSON.parse(localStorage.getItem('ratingHistory') || '[]');
+    
+    fetch('/api/recommendations?fields=' + BROWSE_FIELDS, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ratings: ratingHistory.slice(-RATING_HISTORY_SENT), limit: 9 })  // 3 rows of 3
+    })
     .then(function(res) { return res.json(); })
-    .then(function(recipes) {
-        // Sort recipes by rating in descending order, then by rating count
-        const topRatedRecipes = recipes.sort(function(a, b) {
-            // First sort by rating (descending)
-            if (b.rating !== a.rating) {
-                return b.rating - a.rating;
-            }
-            // Then by rating count (descending) for tie-breaker
-            return b.rating_count - a.rating_count;
-        }).slice(0, 9); // Show top 9 recipes (3 rows of 3)
+    .then(function(data) {
+        const recommendedRecipes = data.recipes || [];
         
-        if (topRatedRecipes.length === 0) {
+        if (recommendedRecipes.length === 0) {
             container.innerHTML = `
                 <div class="no-recommendations col-span-full text-center">
                     <h3 class="text-xl font-semibold mb-2">No recipes available</h3>
@@ -803,7 +832,7 @@ function loadRecommendedRecipes() {
                 </div>
             `;
         } else {
-            displayRecommendedRecipes(topRatedRecipes);
+            displayRecommendedRecipes(recommendedRecipes);
         }
         
         loading.style.display = 'none';
@@ -1007,34 +1036,36 @@ function escapeHtml(text) {
 
 
 // ── Quick Search Functionality ─────────────────────────
-// Quick search from header
-document.getElementById('quick-search').addEventListener('input', function(e) {
-    const searchTerm = e.target.value.toLowerCase().trim();
-    
-    if (searchTerm.length < 2) {
-        // Clear quick search results if too short
+// Suggestions come from GET /api/suggest, which completes ingredient
+// and recipe names on the server. Requests wait until the user stops
+// typing for a moment, and answers to older keystrokes are ignored.
+const QUICK_SEARCH_DELAY_MS = 150;
+let quickSearchTimer = null;
+let quickSearchLatest = '';
+
+function performQuickSearch(query) {
+    clearTimeout(quickSearchTimer);
+    quickSearchLatest = query;
+
+    if (query.length < 2) {
+        // Too short to be useful
         hideQuickSearchResults();
         return;
     }
-    
-    fetch('/api/recipes')
-    .then(function(res) { return res.json(); })
-    .then(function(recipes) {
-        // Filter recipes by name containing search term
-        const filteredRecipes = recipes.filter(function(recipe) {
-            return recipe.name.toLowerCase().includes(searchTerm) ||
-                   recipe.description.toLowerCase().includes(searchTerm) ||
-                   recipe.ingredients.some(function(ing) {
-                       return ing.toLowerCase().includes(searchTerm);
-                   });
+
+    quickSearchTimer = setTimeout(function() {
+        fetch('/api/suggest?q=' + encodeURIComponent(query))
+        .then(function(res) { return res.json(); })
+        .then(function(data) {
+            // Drop answers for a query the user has already changed
+            if (query !== quickSearchLatest) return;
+            showQuickSearchResults(data.suggestions || [], query);
+        })
+        .catch(function() {
+            console.error('Failed to load suggestions');
         });
-        
-        showQuickSearchResults(filteredRecipes, searchTerm);
-    })
-    .catch(function() {
-        console.error('Failed to search recipes');
-    });
-});
+    }, QUICK_SEARCH_DELAY_MS);
+}
 
 // ── Hide Quick Search Results ───────────────────────────
 function hideQuickSearchResults() {
@@ -1044,36 +1075,88 @@ function hideQuickSearchResults() {
     }
 }
 
+// ── Add Ingredient From Quick Search ────────────────────
+function addIngredientToSearch(ingredient) {
+    const ingredientsInput = document.getElementById('ingredients-input');
+    const current = ingredientsInput.value.trim().replace(/,\s*$/, '');
+    ingredientsInput.value = current ? current + ', ' + ingredient : ingredient;
+    ingredientsInput.focus();
+}
+
 // ── Show Quick Search Results ───────────────────────────
-function showQuickSearchResults(recipes, searchTerm) {
+function showQuickSearchResults(suggestions, searchTerm) {
     // Remove existing quick search results
     hideQuickSearchResults();
     
-    if (recipes.length === 0) {
-        return;
-    }
-    
     // Create quick search dropdown
     const dropdown = document.createElement('div');
     dropdown.className = 'quick-search-results';
-    dropdown.innerHTML = '<div class="quick-search-header">Found ' + recipes.length + ' recipe' + (recipes.length === 1 ? '' : 's') + ' for "' + searchTerm + '"</div>';
+    dropdown.innerHTML = '<div class="quick-search-header">Suggestions for "' + escapeHtml(searchTerm) + '"</div>';
     
-    recipes.slice(0, 5).forEach(function(recipe) {
+    suggestions.forEach(function(suggestion) {
         const item = document.createElement('div');
         item.className = 'quick-search-item';
-        item.innerHTML = '<strong>' + recipe.name + '</strong><br><small>' + recipe.cuisine + ' • ' + recipe.cook_time + ' min</small>';
-        item.onclick = function() {
-            openRecipeDetail(recipe.id);
-            hideQuickSearchResults();
-        };
+        if (suggestion.type === 'recipe') {
+            // Recipes open their detail view
+            item.innerHTML = '<strong>' + escapeHtml(suggestion.text) + '</strong><br><small>Recipe</small>';
+            item.onclick = function() {
+                openRecipeDetail(suggestion.id);
+                hideQuickSearchResults();
+            };
+        } else {
+            // Ingredients are added to the ingredient search box
+            item.innerHTML = '<strong>' + escapeHtml(suggestion.text) + '</strong><br><small>Ingredient • used in ' +
+                suggestion.count + ' recipe' + (suggestion.count === 1 ? '' : 's') + '</small>';
+            item.onclick = function() {
+                addIngredientToSearch(suggestion.text);
+                hideQuickSearchResults();
+            };
+        }
         dropdown.appendChild(item);
     });
     
+    // Last item: search recipe names, descriptions and instructions
+    const textItem = document.createElement('div');
+    textItem.className = 'quick-search-item';
+    textItem.innerHTML = '<strong>Search recipes for "' + escapeHtml(searchTerm) + '"</strong><br><small>Names, descriptions and instructions</small>';
+    textItem.onclick = function() {
+        hideQuickSearchResults();
+        searchRecipesByText(searchTerm);
+    };
+    dropdown.appendChild(textItem);
+    
     // Position dropdown below search bar
     const searchContainer = document.querySelector('.quick-search-section');
     searchContainer.appendChild(dropdown);
 }
 
+// ── Full-Text Recipe Search ─────────────────────────────
+// Shows GET /api/recipes/search results in the browse grid, with the
+// matching text (already HTML-escaped by the server) as the description.
+function searchRecipesByText(query) {
+    document.getElementById('browse-loading').style.display = 'block';
+    document.getElementById('browse-container').innerHTML = '';
+    document.getElementById('browse-section').scrollIntoView({ behavior: 'smooth' });
+    
+    fetch('/api/recipes/search?limit=30&fields=' + BROWSE_FIELDS + '&q=' + encodeURIComponent(query))
+    .then(function(response) {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.json();
+    })
+    .then(function(data) {
+        displayBrowseRecipes(data.recipes);
+        document.getElementById('browse-loading').style.display = 'none';
+    })
+    .catch(function(error) {
+        console.error('Error searching recipes:', error);
+        document.getElementById('browse-loading').style.display = 'none';
+        document.getElementById('browse-container').innerHTML = 
+            '<div class="error-message">Search failed. Please try again.</div>';
+    });
+}
+
 // ── Saved Recipes Functions ───────────────────────────────
 function showSavedRecipes() {
     const resultsContainer = document.getElementById('results-container');
@@ -1141,7 +1224,7 @@ function loadAllRecipes() {
     document.getElementById('browse-loading').style.display = 'block';
     document.getElementById('browse-container').innerHTML = '';
     
-    fetch('/api/recipes')
+    fetch('/api/recipes?fields=' + BROWSE_FIELDS)
     .then(function(response) {
         console.log('Response status:', response.status);
         if (!response.ok) {
@@ -1252,7 +1335,7 @@ function displayBrowseRecipes(recipes) {
                     </h4>
                     
                     <p class="recipe-description">
-                        ${escapeHtml(recipe.description)}
+                        ${recipe.snippet || escapeHtml(recipe.description)}
                     </p>
                     
                     <div class="recipe-footer">
@@ -1339,90 +1422,4 @@ function getDifficultyIcon(difficulty) {
     }
 }
 
-// ── Analyze User Preferences ───────────────────────────────
-function analyzeUserPreferences(ratingHistory, recipes) {
-    const preferences = {
-        cuisines: {},
-        difficulties: {},
-        avgRating: 0,
-        totalRatings: ratingHistory.length
-    };
-    
-    // Calculate average rating
-    preferences.avgRating = ratingHistory.reduce(function(sum, r) {
-        return sum + r.rating;
-    }, 0) / ratingHistory.length;
-    
-    // Analyze cuisine and difficulty preferences
-    ratingHistory.forEach(function(rating) {
-        const recipe = recipes.find(function(rec) {
-            return rec.id === rating.recipe_id;
-        });
-        
-        if (recipe) {
-            // Count cuisine preferences
-            preferences.cuisines[recipe.cuisine] = (preferences.cuisines[recipe.cuisine] || 0) + 1;
-            
-            // Count difficulty preferences
-            preferences.difficulties[recipe.difficulty] = (preferences.difficulties[recipe.difficulty] || 0) + 1;
-        }
-    });
-    
-    return preferences;
-}
-
-// ── Generate Recipe Suggestions ───────────────────────────
-function generateRecipeSuggestions(recipes, preferences) {
-    const suggestions = [];
-    const usedIds = new Set();
-    
-    // Get top preferred cuisines and difficulties
-    const topCuisines = Object.entries(preferences.cuisines)
-        .sort((a, b) => b[1] - a[1])
-        .slice(0, 3)
-        .map(entry => entry[0]);
-    
-    const topDifficulties = Object.entries(preferences.difficulties)
-        .sort((a, b) => b[1] - a[1])
-        .slice(0, 2)
-        .map(entry => entry[0]);
-    
-    // Suggest recipes from preferred cuisines
-    topCuisines.forEach(function(cuisine) {
-        const cuisineRecipes = recipes.filter(function(r) {
-            return r.cuisine === cuisine && !usedIds.has(r.id) && r.rating >= preferences.avgRating;
-        });
-        
-        // Add top 2 recipes from each preferred cuisine
-        cuisineRecipes.slice(0, 2).forEach(function(recipe) {
-            suggestions.push(recipe);
-            usedIds.add(recipe.id);
-        });
-    });
-    
-    // Suggest recipes from preferred difficulties
-    topDifficulties.forEach(function(difficulty) {
-        const difficultyRecipes = recipes.filter(function(r) {
-            return r.difficulty === difficulty && !usedIds.has(r.id) && r.rating >= preferences.avgRating;
-        });
-        
-        // Add top recipe from each preferred difficulty
-        if (difficultyRecipes.length > 0) {
-            suggestions.push(difficultyRecipes[0]);
-            usedIds.add(difficultyRecipes[0].id);
-        }
-    });
-    
-    // Fill remaining slots with highly-rated recipes
-    const highRatedRecipes = recipes.filter(function(r) {
-        return !usedIds.has(r.id) && r.rating >= 4.0;
-    });
-    
-    highRatedRecipes.slice(0, 2).forEach(function(recipe) {
-        suggestions.push(recipe);
-    });
-    
-    return suggestions.slice(0, 6); // Return max 6 suggestions
-}
-
 // ── Initialize ────────────────────────────────────────────
@@ -0,0 +1,71 @@
+"""
+Substitution Graph
+==================
+Gives partial credit in search for ingredients the user can swap in.
+
+Every recipe lists substitutions as free text, e.g.
+
+    {"chicken breast": "tofu or shrimp", "soy sauce": "tamari (gluten-free)"}
+
+A swap only makes sense in the recipe that suggests it (water can
+stand in for milk in pancakes, not in a custard), so the graph keeps
+each recipe's substitutions separately:
+
+    substitute phrase -> [(recipe id, ingredient it replaces there)]
+                         "tofu" -> [(3, "chicken breast"), ...]
+
+The phrases are indexed with the same token matcher used for search
+(matcher.py). A search looks up the phrases the user has in full,
+once, and follows the map, so finding every substitutable ingredient
+costs the same no matter how many recipes there are. Having one word
+of a phrase isn't enough: "water" doesn't cover "sparkling water" and
+"oil" doesn't cover "coconut oil".
+"""
+
+from collections import defaultdict
+import re
+
+from matcher import IngredientMatcher
+
+# "tofu or shrimp", "trout, cod", "lamb or chickpeas (vegetarian)"
+SPLIT_RE = re.compile(r',|/|\bor\b')
+NOTE_RE = re.compile(r'\([^)]*\)')
+
+
+def parse_substitutes(text):
+    """Split a substitution text into lowercase phrases, dropping notes in brackets."""
+    text = NOTE_RE.sub('', text.lower())
+    return [phrase.strip() for phrase in SPLIT_RE.split(text) if phrase.strip()]
+
+
+class SubstitutionGraph:
+    """Substitute phrase -> the (recipe, ingredient) pairs it can replace."""
+
+    def __init__(self, recipes):
+        # substitute phrase -> list of (recipe id, ingredient name)
+        self.replaces = defaultdict(list)
+
+        for recipe in recipes:
+            ingredients = {ing.lower() for ing in recipe['ingredients']}
+            for ingredient, text in recipe['substitutions'].items():
+                ingredient = ingredient.lower()
+                if ingredient not in ingredients:
+                    continue  # a note about something the recipe doesn't use
+                for phrase in parse_substitutes(text):
+                    self.replaces[phrase].append((recipe['id'], ingredient))
+
+        self.matcher = IngredientMatcher(self.replaces)
+
+    def covered(self, user_ingredients, matched):
+        """
+        Return {recipe_id: {ingredient: substitute}} for every recipe
+        ingredient the user doesn't have but can replace, according to
+        that recipe, with a substitute they do have.
+        `matched` is the set of ingredients the user has (matcher.py).
+        """
+        covered = defaultdict(dict)
+        for phrase in sorted(self.matcher.contained(user_ingredients)):
+            for recipe_id, ingredient in self.replaces[phrase]:
+                if ingredient not in matched:
+                    covered[recipe_id].setdefault(ingredient, phrase)
+        return dict(covered)
@@ -0,0 +1,87 @@
+"""
+Autocomplete Suggestions
+========================
+Prefix search over ingredient and recipe names for GET /api/suggest.
+
+Instead of a trie we keep one sorted list of lowercase keys and use
+bisect, which gives the same prefix lookups with far less memory:
+every key starting with "chi" sits in one contiguous slice of the list,
+between bisect_left("chi") and bisect_left("chi\\uffff").
+
+Each name is indexed under the start of every word, so "beef" also
+finds "ground beef". Completions are ranked by how many recipes use
+the ingredient (recipe names rank by their vote count when the
+catalogue loaded; later votes don't reorder them), and the top
+results for very short prefixes, which match the most keys, are
+remembered after the first lookup.
+"""
+
+from bisect import bisect_left
+import heapq
+import threading
+
+
+class Suggester:
+    """Sorted prefix index over distinct ingredient names and recipe names."""
+
+    # Prefixes this short are looked up often and match many keys
+    MEMO_PREFIX_LENGTH = 2
+
+    def __init__(self, recipes):
+        # One entry per suggestion: (text, type, frequency, recipe id or None)
+        self.entries = []
+        ingredient_entry = {}
+        for recipe in recipes:
+            for ing in {i.lower() for i in recipe['ingredients']}:
+                if ing not in ingredient_entry:
+                    ingredient_entry[ing] = len(self.entries)
+                    self.entries.append([ing, 'ingredient', 0, None])
+                self.entries[ingredient_entry[ing]][2] += 1
+            self.entries.append([recipe['name'], 'recipe', recipe['rating_count'], recipe['id']])
+
+        # (key, entry number) for every word start of every name, sorted
+        keyed = []
+        for number, (text, _, _, _) in enumerate(self.entries):
+            words = text.lower().split()
+            for i in range(len(words)):
+                keyed.append((' '.join(words[i:]), number))
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.numbers = [number for _, number in keyed]
+
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def suggest(self, prefix, limit=8):
+        """Return up to `limit` suggestions for a prefix, most used first."""
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        if len(prefix) <= self.MEMO_PREFIX_LENGTH:
+            key = (prefix, limit)
+            result = self._memo.get(key)
+            if result is None:
+                result = self._lookup(prefix, limit)
+                if result:
+                    # Only prefixes that exist in the catalogue, so the memo stays small
+                    with self._lock:
+                        self._memo[key] = result
+            return result
+        return self._lookup(prefix, limit)
+
+    def _lookup(self, prefix, limit):
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        numbers = set(self.numbers[lo:hi])  # a name can match on two words
+        # Most used first, then ingredients before recipes, then alphabetical
+        best = heapq.nsmallest(limit, numbers, key=lambda n: (
+            -self.entries[n][2], self.entries[n][1], self.entries[n][0]
+        ))
+        suggestions = []
+        for number in best:
+            text, kind, frequency, recipe_id = self.entries[number]
+            suggestion = {'text': text, 'type': kind, 'count': frequency}
+            if recipe_id is not None:
+                suggestion['id'] = recipe_id
+            suggestions.append(suggestion)
+        return suggestions
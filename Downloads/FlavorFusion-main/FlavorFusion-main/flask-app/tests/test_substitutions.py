@@ -0,0 +1,50 @@
+"""Tests for substitution credit (substitutions.py)."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from substitutions import SubstitutionGraph
+
+
+# Substitution notes as they appear in the seed recipes
+RECIPES = [
+    {'id': 1, 'ingredients': ['flour', 'milk', 'eggs'],
+     'substitutions': {'milk': 'water'}},
+    {'id': 2, 'ingredients': ['onion', 'vegetable broth'],
+     'substitutions': {'vegetable broth': 'water with bouillon'}},
+    {'id': 3, 'ingredients': ['fish', 'beer', 'flour'],
+     'substitutions': {'beer': 'sparkling water'}},
+    {'id': 4, 'ingredients': ['flour', 'butter', 'sugar'],
+     'substitutions': {'butter': 'coconut oil'}},
+    {'id': 5, 'ingredients': ['noodles', 'sesame oil'],
+     'substitutions': {'sesame oil': 'vegetable oil'}},
+    {'id': 6, 'ingredients': ['chicken', 'white wine'],
+     'substitutions': {'white wine': 'extra broth with lemon juice'}},
+    {'id': 7, 'ingredients': ['lettuce', 'red wine vinegar'],
+     'substitutions': {'red wine vinegar': 'lemon juice'}},
+    {'id': 8, 'ingredients': ['eggs', 'milk', 'sugar'],
+     'substitutions': {}},
+]
+
+graph = SubstitutionGraph(RECIPES)
+
+
+def test_water_only_covers_plain_water():
+    # Not "water with bouillon" or "sparkling water", and only in the
+    # recipe that suggests water for milk (not recipe 8)
+    assert graph.covered(['water'], set()) == {1: {'milk': 'water'}}
+
+
+def test_oil_does_not_cover_specific_oils():
+    assert graph.covered(['oil'], set()) == {}
+    assert graph.covered(['coconut oil'], set()) == {4: {'butter': 'coconut oil'}}
+
+
+def test_lemon_juice_needs_the_whole_phrase():
+    assert graph.covered(['lemon juice'], set()) == {7: {'red wine vinegar': 'lemon juice'}}
+
+
+def test_ingredients_the_user_has_are_not_covered():
+    assert graph.covered(['water'], {'milk'}) == {}